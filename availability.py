@@ -0,0 +1,222 @@
+import logging
+import threading
+from datetime import date, timedelta
+
+from scheduling import DaySchedule, DEFAULT_HOURS, to_minutes, from_minutes, iso_day
+
+logger = logging.getLogger(__name__)
+
+# Сетка времени записи по умолчанию (у салонов может быть своя)
+TIMES = ["09:00", "10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00", "18:00", "19:00"]
+
+DEFAULT_DURATION = 60
+# Сколько ближайших дней читать из базы, пока индекс не прогрет
+# (календарь записи — render.CALENDAR_DAYS)
+LAZY_DAYS = 7
+
+
+class AvailabilityIndex:
+    # Занятость по дням одного салона: для каждой даты храним отсортированные
+    # интервалы записей (DaySchedule). Заполняется один раз при запуске и
+    # дальше обновляется точечно при подтверждении и отмене записи.
+
+    def __init__(self, times=TIMES, hours=DEFAULT_HOURS, day_capacity=None):
+        self._days = {}
+        self._lock = threading.Lock()
+        self.ready = False
+        self.times = list(times)
+        self.time_minutes = [to_minutes(time) for time in self.times]
+        self.hours = hours
+        # Сколько записей в день принимает салон; None — без ограничения
+        self.day_capacity = day_capacity
+        # Версии для кэшей клавиатур: generation меняется при полной
+        # загрузке, _versions[date_str] — при каждой записи/отмене на день
+        self.generation = 0
+        self._versions = {}
+
+    def configure(self, times, hours, day_capacity):
+        # Новые часы работы и сетка салона (горячая перезагрузка настроек)
+        with self._lock:
+            self.times = list(times)
+            self.time_minutes = [to_minutes(time) for time in self.times]
+            self.hours = hours
+            self.day_capacity = day_capacity
+            for schedule in self._days.values():
+                schedule.hours = hours
+            self.generation += 1
+
+    def _build(self, rows):
+        days = {}
+        conflicts = 0
+        for date_str, time_str, duration in rows:
+            start = to_minutes(time_str)
+            schedule = days.get(date_str)
+            if schedule is None:
+                schedule = days[date_str] = DaySchedule(self.hours)
+            if not schedule.add(start, start + (duration or DEFAULT_DURATION)):
+                conflicts += 1
+        return days, conflicts
+
+    def load(self, rows):
+        # rows — (date, time, duration) активных будущих записей салона
+        days, conflicts = self._build(rows)
+        with self._lock:
+            self._days = days
+            self.generation += 1
+        self.ready = True
+        return conflicts
+
+    def load_day(self, date_str, rows, expected_version=None):
+        # Перечитанный из базы день: записи могли сделать другие процессы.
+        # expected_version — версия дня до чтения из базы; если с тех пор
+        # этот процесс сам записал или отменил на день, rows уже устарели
+        days, _ = self._build(rows)
+        with self._lock:
+            if expected_version is not None and self._versions.get(date_str, 0) != expected_version:
+                return False
+            if date_str in days:
+                self._days[date_str] = days[date_str]
+            else:
+                self._days.pop(date_str, None)
+            self._versions[date_str] = self._versions.get(date_str, 0) + 1
+            return True
+
+    def day_versions(self):
+        with self._lock:
+            return dict(self._versions)
+
+    def book(self, date_str, time_str, duration=DEFAULT_DURATION):
+        # Возвращает False, если интервал уже занят
+        start = to_minutes(time_str)
+        with self._lock:
+            schedule = self._days.get(date_str)
+            if schedule is None:
+                schedule = self._days[date_str] = DaySchedule(self.hours)
+            if not schedule.add(start, start + duration):
+                return False
+            self._versions[date_str] = self._versions.get(date_str, 0) + 1
+            return True
+
+    def release(self, date_str, time_str, duration=DEFAULT_DURATION):
+        start = to_minutes(time_str)
+        with self._lock:
+            schedule = self._days.get(date_str)
+            if schedule is None:
+                return
+            schedule.remove(start, start + duration)
+            self._versions[date_str] = self._versions.get(date_str, 0) + 1
+            if not schedule:
+                del self._days[date_str]
+
+    def version(self, date_str):
+        return self.generation, self._versions.get(date_str, 0)
+
+    def _schedule(self, date_str):
+        return self._days.get(date_str) or DaySchedule(self.hours)
+
+    def _full(self, schedule):
+        return self.day_capacity is not None and len(schedule) >= self.day_capacity
+
+    def free_times(self, date_str, duration=DEFAULT_DURATION):
+        schedule = self._schedule(date_str)
+        if self._full(schedule):
+            return []
+        return [from_minutes(start) for start in schedule.fitting_starts(self.time_minutes, duration)]
+
+    def has_capacity(self, date_str, duration=DEFAULT_DURATION):
+        schedule = self._schedule(date_str)
+        if self._full(schedule):
+            return False
+        return any(schedule.is_free(start, start + duration) for start in self.time_minutes)
+
+
+class TenantAvailability:
+    # Индексы занятости по салонам: у каждого свой AvailabilityIndex
+
+    def __init__(self):
+        self._indexes = {}
+        self.ready = False
+        # Салоны, чьи ближайшие дни уже прочитаны до окончания прогрева
+        self._lazy = set()
+        # (tenant_id, date) -> (число, сумма id) активных записей дня, как в
+        # индексе; по изменению отпечатка sync перечитывает день
+        self._fingerprints = {}
+
+    def get(self, tenant_id):
+        index = self._indexes.get(tenant_id)
+        if index is None:
+            index = self._indexes[tenant_id] = AvailabilityIndex()
+        return index
+
+    def configure(self, tenant_id, times, hours, day_capacity):
+        self.get(tenant_id).configure(times, hours, day_capacity)
+
+    async def warm(self, db):
+        # Прошедшие дни в календаре не показываются, грузим только будущие
+        today = date.today().isoformat()
+        rows = await db.fetchall("""SELECT tenant_id, date, time, duration, id FROM appointments
+                                    WHERE day >= ? AND status = 'active'""",
+                                 (today,), label='availability_warm')
+        by_tenant = {tenant_id: [] for tenant_id in self._indexes}
+        fingerprints = {}
+        for tenant_id, date_str, time_str, duration, appointment_id in rows:
+            by_tenant.setdefault(tenant_id, []).append((date_str, time_str, duration))
+            count, id_sum = fingerprints.get((tenant_id, date_str), (0, 0))
+            fingerprints[(tenant_id, date_str)] = (count + 1, id_sum + appointment_id)
+        self._fingerprints = fingerprints
+        conflicts = 0
+        for tenant_id, tenant_rows in by_tenant.items():
+            conflicts += self.get(tenant_id).load(tenant_rows)
+        self.ready = True
+        if conflicts:
+            logger.warning(f"Индекс занятости: {conflicts} пересекающихся записей пропущено")
+        logger.info(f"Индекс занятости загружен: {len(rows)} записей, салонов: {len(by_tenant)}")
+
+    async def sync(self, db):
+        # Сверка с записями других процессов (несколько воркеров): по
+        # отпечаткам дней находим изменившиеся и перечитываем только их.
+        # Остальные дни и кэши их клавиатур не трогаем.
+        before = {tenant_id: index.day_versions() for tenant_id, index in self._indexes.items()}
+        rows = await db.fetchall("""SELECT tenant_id, MIN(date), COUNT(*), SUM(id) FROM appointments
+                                    WHERE day >= ? AND status = 'active' GROUP BY tenant_id, day""",
+                                 (date.today().isoformat(),), label='availability_fingerprints')
+        current = {(tenant_id, date_str): (count, id_sum) for tenant_id, date_str, count, id_sum in rows}
+        changed = [key for key in current.keys() | self._fingerprints.keys()
+                   if current.get(key) != self._fingerprints.get(key)]
+        for tenant_id, date_str in changed:
+            day_rows = await db.fetchall("""SELECT date, time, duration FROM appointments
+                                            WHERE tenant_id = ? AND day = ? AND status = 'active'""",
+                                         (tenant_id, iso_day(date_str)), label='availability_day')
+            expected = before.get(tenant_id, {}).get(date_str, 0)
+            # День изменился здесь же во время чтения — сверим в следующий раз
+            if self.get(tenant_id).load_day(date_str, day_rows, expected):
+                if (tenant_id, date_str) in current:
+                    self._fingerprints[(tenant_id, date_str)] = current[(tenant_id, date_str)]
+                else:
+                    self._fingerprints.pop((tenant_id, date_str), None)
+        return len(changed)
+
+    async def ensure(self, db, tenant_id):
+        # Обновления обрабатываются сразу после запуска, а warm идет в фоне.
+        # До его окончания календарь салона строится по ближайшим LAZY_DAYS
+        # дням, прочитанным одним запросом по индексу (tenant_id, day).
+        if self.ready or tenant_id in self._lazy:
+            return
+        today = date.today()
+        rows = await db.fetchall("""SELECT date, time, duration FROM appointments
+                                    WHERE tenant_id = ? AND day >= ? AND day < ? AND status = 'active'""",
+                                 (tenant_id, today.isoformat(), (today + timedelta(days=LAZY_DAYS)).isoformat()),
+                                 label='availability_lazy')
+        if self.ready:
+            return
+        self.get(tenant_id).load(rows)
+        self._lazy.add(tenant_id)
+
+    async def refresh_day(self, db, tenant_id, date_str):
+        rows = await db.fetchall("""SELECT date, time, duration FROM appointments
+                                    WHERE tenant_id = ? AND day = ? AND status = 'active'""",
+                                 (tenant_id, iso_day(date_str)), label='availability_day')
+        self.get(tenant_id).load_day(date_str, rows)
+
+
+availability = TenantAvailability()
@@ -0,0 +1,154 @@
+# Нагрузочная проверка подтверждения записи: сотни одновременных
+# подтверждений на одни и те же слоты из нескольких процессов, как у
+# воркеров бота (WORKERS > 1). У каждого процесса свой Database и своя
+# _write_lock, поэтому слоты между процессами делит только SQLite:
+#
+#   confirm — create_booking в BEGIN IMMEDIATE (проверка пересечения);
+#   index   — INSERT без проверки и без транзакции, дубли отсекает только
+#             частичный уникальный индекс idx_appointments_active_slot.
+#
+# Каждый слот должен быть занят ровно один раз, остальные попытки
+# получают SlotTakenError (IntegrityError в режиме index).
+#
+#   python benchmarks/bench_booking_concurrency.py --confirms 500 --processes 4
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ('confirm', 'index')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--confirms', type=int, default=500, help='всего подтверждений во всех процессах')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def insert_unchecked(conn, data):
+    # Вставка в обход create_booking: проверка слота только индексом
+    conn.execute("""INSERT INTO appointments (service, service_key, price, duration, date, time, name, phone,
+                                              day, minute, tenant_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)""",
+                 (data['service'], data['service_key'], data['price'], data['duration'], data['date'],
+                  data['time'], data['name'], data['phone'], data['day'], data['minute']))
+
+
+async def confirms(path, mode, process, count, args):
+    from db import Database
+    from availability import TIMES
+    from booking import create_booking, SlotTakenError
+    from scheduling import iso_day, to_minutes
+
+    database = Database(path, args.pool_size)
+    database.open()
+    rng = random.Random(args.seed * 1000 + process)
+    dates = [f"{day + 1:02d}.03.2030" for day in range(args.days)]
+    slots = [(date, time) for date in dates for time in TIMES]
+
+    async def confirm(i):
+        date, time_str = rng.choice(slots)
+        data = {
+            'service': 'Стрижка', 'service_key': 'haircut_woman', 'price': 1500, 'duration': 60,
+            'date': date, 'time': time_str, 'name': f"Клиент {process}-{i}", 'phone': f"+79{process:02d}{i:07d}",
+            'day': iso_day(date), 'minute': to_minutes(time_str),
+        }
+        try:
+            if mode == 'confirm':
+                await database.transaction(create_booking, data, label='create_booking')
+            else:
+                await database.run(insert_unchecked, data, label='insert_unchecked')
+            return 'booked'
+        except (SlotTakenError, sqlite3.IntegrityError):
+            return 'taken'
+        except sqlite3.OperationalError:
+            # database is locked: busy_timeout истек — так быть не должно
+            return 'error'
+
+    try:
+        return await asyncio.gather(*(confirm(i) for i in range(count)))
+    finally:
+        database.close()
+
+
+def worker(path, mode, process, count, args, barrier, results):
+    import logging
+    import importlib
+
+    # Импорты до старта, чтобы не входили в замер
+    for module in ('db', 'booking', 'availability'):
+        importlib.import_module(module)
+    # Долгие запросы здесь ожидаемы: это ожидание блокировки другого процесса
+    logging.getLogger('db').setLevel(logging.ERROR)
+    # Все процессы стартуют одновременно, чтобы конкурировать за одни слоты
+    barrier.wait()
+    outcomes = asyncio.run(confirms(path, mode, process, count, args))
+    results.put({outcome: outcomes.count(outcome) for outcome in ('booked', 'taken', 'error')})
+
+
+def run(mode, args, tmp):
+    from migrations import migrate
+
+    path = os.path.join(tmp, f'{mode}.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    migrate(conn)
+    conn.close()
+
+    # spawn, как у воркеров бота: без унаследованных соединений
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.processes + 1)
+    results = context.Queue()
+    shares = [args.confirms // args.processes + (i < args.confirms % args.processes)
+              for i in range(args.processes)]
+    processes = [context.Process(target=worker, args=(path, mode, i, shares[i], args, barrier, results))
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    started = time.perf_counter()
+    totals = {'booked': 0, 'taken': 0, 'error': 0}
+    for _ in processes:
+        for outcome, count in results.get().items():
+            totals[outcome] += count
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    conn = sqlite3.connect(path)
+    rows = conn.execute("""SELECT date, time, COUNT(*) FROM appointments
+                           WHERE status = 'active' GROUP BY date, time""").fetchall()
+    conn.close()
+    print(f"[{mode}] процессов: {args.processes}, попыток: {args.confirms}, успешных: {totals['booked']}, "
+          f"отказов: {totals['taken']}, ошибок блокировки: {totals['error']}")
+    print(f"[{mode}] время: {elapsed * 1000:.1f} мс, {args.confirms / elapsed:.0f} попыток/с")
+
+    duplicates = [row for row in rows if row[2] != 1]
+    assert not duplicates, f"Двойное бронирование: {duplicates}"
+    assert totals['booked'] == len(rows), f"Успешных {totals['booked']}, а активных слотов {len(rows)}"
+    assert not totals['error'], "Попытки упали по busy_timeout"
+    print(f"[{mode}] OK: каждый слот занят ровно один раз\n")
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in MODES:
+            run(mode, args, tmp)
+
+
+if __name__ == '__main__':
+    main()
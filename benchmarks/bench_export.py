@@ -0,0 +1,85 @@
+# Выгрузка /export на нескольких миллионах синтетических записей: время,
+# размер архива и прирост пикового RSS процесса за время выгрузки.
+#
+#   python benchmarks/bench_export.py --rows 3000000 --max-rss-mb 64
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import resource
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+from export import export_table, FORMATS
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def fill(conn, rows):
+    # Строки генерирует сам SQLite, чтобы заполнение не раздувало RSS Python
+    conn.execute("BEGIN")
+    conn.execute('''WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                    INSERT INTO appointments
+                    (service, service_key, price, duration, date, time, name, phone, status, day, minute)
+                    SELECT 'Женская стрижка', 'haircut_woman', 1500, 60,
+                           strftime('%d.%m.%Y', '2020-01-01', '+' || (i / 8) || ' days'),
+                           printf('%02d:00', 9 + i % 8),
+                           'Клиент ' || i, printf('+79%09d', i),
+                           CASE WHEN i % 8 = 0 THEN 'cancelled' ELSE 'completed' END,
+                           date('2020-01-01', '+' || (i / 8) || ' days'),
+                           (9 + i % 8) * 60
+                    FROM n''', (rows,))
+    conn.execute("COMMIT")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=3000000)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--max-rss-mb', type=float, default=64,
+                        help='допустимый прирост пикового RSS за время выгрузки')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'), isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Уникальный индекс по активному слоту не мешает: синтетика не активна
+        migrate(conn)
+        started = time.perf_counter()
+        fill(conn, args.rows)
+        print(f"Заполнено {args.rows} строк за {time.perf_counter() - started:.1f} с")
+
+        cases = [('вся таблица', None, None),
+                 ('один месяц', date(2021, 3, 1), date(2021, 3, 31))]
+        failed = False
+        for label, first, last in cases:
+            rss_before = peak_rss_mb()
+            started = time.perf_counter()
+            spool, count = export_table(conn, 'appointments', args.format, first, last)
+            elapsed = time.perf_counter() - started
+            with spool:
+                size = spool.seek(0, os.SEEK_END)
+                on_disk = spool._rolled
+            growth = peak_rss_mb() - rss_before
+            print(f"  {label:<12} строк: {count:<9} {elapsed:7.2f} с  {count / elapsed:9.0f} строк/с  "
+                  f"архив: {size / 2 ** 20:7.1f} МБ ({'диск' if on_disk else 'память'})  "
+                  f"прирост пикового RSS: {growth:.1f} МБ")
+            if growth > args.max_rss_mb:
+                failed = True
+        conn.close()
+
+    if failed:
+        print(f"ОШИБКА: прирост RSS больше {args.max_rss_mb} МБ")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
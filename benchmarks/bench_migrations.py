@@ -0,0 +1,121 @@
+# Стоимость диапазонных запросов до и после миграций day/minute и индексов
+# на таблице appointments с миллионом строк.
+#
+#   python benchmarks/bench_migrations.py --rows 1000000
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import MIGRATIONS, migrate, SQL_ISO_DAY
+from availability import TIMES
+
+SERVICES = [('haircut_woman', 1500, 60), ('haircut_man', 800, 45), ('haircut_child', 700, 40),
+            ('coloring', 2500, 120), ('complex', 2200, 90)]
+
+START_DAY = date(2028, 1, 1)
+QUERY_DAY = date(2029, 3, 10)
+
+
+def fill(conn, rows, seed):
+    rng = random.Random(seed)
+    used = set()
+    days = 3 * 365
+
+    def generate():
+        for i in range(rows):
+            day = START_DAY + timedelta(days=rng.randrange(days))
+            time_str = rng.choice(TIMES)
+            slot = (day, time_str)
+            status = 'completed' if slot in used else 'active'
+            used.add(slot)
+            key, price, duration = rng.choice(SERVICES)
+            yield (key, key, price, duration, day.strftime('%d.%m.%Y'), time_str,
+                   f"Клиент {i}", f"+79{rng.randrange(10 ** 9):09d}", status)
+
+    conn.execute("BEGIN")
+    conn.executemany('''INSERT INTO appointments
+                     (service, service_key, price, duration, date, time, name, phone, status)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', generate())
+    conn.execute("COMMIT")
+
+
+def timed(conn, label, sql, params, repeat):
+    plan = ' | '.join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = conn.execute(sql, params).fetchall()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"  {label:<24} {elapsed * 1000:9.2f} мс  строк: {len(result):<6} план: {plan}")
+    return elapsed
+
+
+def run_queries(conn, before, repeat):
+    week = (QUERY_DAY.isoformat(), (QUERY_DAY + timedelta(days=7)).isoformat())
+    month = QUERY_DAY.strftime('%Y-%m')
+    phone = ('+79000000000',)
+    if before:
+        # Без столбца day приходится разбирать строку даты в каждой строке
+        queries = [
+            ('ближайшие 7 дней', f'''SELECT date, time, duration FROM appointments
+                                  WHERE status = 'active' AND {SQL_ISO_DAY} BETWEEN ? AND ?''', week),
+            ('выручка за месяц', f'''SELECT SUM(price), COUNT(*) FROM appointments
+                                  WHERE status = 'active' AND substr({SQL_ISO_DAY}, 1, 7) = ?''', (month,)),
+            ('поиск по телефону', "SELECT id FROM appointments WHERE phone = ?", phone),
+        ]
+    else:
+        queries = [
+            ('ближайшие 7 дней', '''SELECT date, time, duration FROM appointments
+                                 WHERE day BETWEEN ? AND ? AND status = 'active' ''', week),
+            ('выручка за месяц', '''SELECT SUM(price), COUNT(*) FROM appointments
+                                 WHERE day BETWEEN ? AND ? AND status = 'active' ''',
+             (f"{month}-01", f"{month}-31")),
+            ('поиск по телефону', "SELECT id FROM appointments WHERE phone = ?", phone),
+        ]
+    return {label: timed(conn, label, sql, params, repeat) for label, sql, params in queries}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'), isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        # Схема версии 1 — как до миграций
+        MIGRATIONS[0][2](conn)
+        conn.execute("PRAGMA user_version = 1")
+        started = time.perf_counter()
+        fill(conn, args.rows, args.seed)
+        print(f"Заполнено {args.rows} строк за {time.perf_counter() - started:.1f} с\n")
+
+        print("До миграций:")
+        before = run_queries(conn, True, args.repeat)
+
+        started = time.perf_counter()
+        version = migrate(conn)
+        print(f"\nМиграция до версии {version}: {time.perf_counter() - started:.1f} с\n")
+
+        print("После миграций:")
+        after = run_queries(conn, False, args.repeat)
+
+        print()
+        for label in before:
+            print(f"  {label:<24} x{before[label] / after[label]:.0f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# Стоимость отрисовки клавиатур и текстов на одно обновление: сборка
+# разметки при каждом вызове (как в обработчиках до render.py) против
+# готовых разметок Renderer с кэшем по версии дня.
+#
+#   python benchmarks/bench_render.py --flows 20000 --book-every 50
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+
+from availability import AvailabilityIndex
+from render import Renderer, WEEKDAYS
+
+SERVICES = {
+    "haircut_woman": {"name": "💇 Женская стрижка", "price": 1500, "duration": 60},
+    "haircut_man": {"name": "💇‍♂️ Мужская стрижка", "price": 800, "duration": 45},
+    "haircut_child": {"name": "👧 Детская стрижка", "price": 700, "duration": 40},
+    "coloring": {"name": "🎨 Окрашивание", "price": 2500, "duration": 120},
+    "complex": {"name": "✨ Комплекс (стрижка+укладка)", "price": 2200, "duration": 90}
+}
+
+USER_DATA = {'name': 'Клиент', 'phone': '+79123456789', 'service': SERVICES['complex']['name'],
+             'price': 2200, 'date': '01.01.2030', 'time': '10:00', 'booking_token': '0f1e2d3c'}
+
+
+# Сборка «на месте», как это делали обработчики
+def legacy_main_menu(first_name):
+    text = (f"👋 <b>Добро пожаловать, {first_name}!</b>\n\n"
+            f"✨ <b>Салон красоты 'Ольга Карре'</b>\n\n"
+            "💫 <b>Мы предлагаем:</b>\n• Профессиональные стрижки\n• Модное окрашивание\n"
+            "• Стильные укладки\n\n📋 <b>Основные команды:</b>\n• /book - 📝 Новая запись\n"
+            "• /my_bookings - 📋 Мои записи\n• /services - 💰 Услуги и цены\n"
+            "• /reviews - ⭐ Отзывы\n• /contacts - 📞 Контакты")
+    keyboard = [
+        [InlineKeyboardButton("📝 Записаться онлайн", callback_data="quick_book")],
+        [InlineKeyboardButton("💰 Услуги и цены", callback_data="show_services")],
+        [InlineKeyboardButton("⭐ Оставить отзыв", callback_data="leave_review")],
+        [InlineKeyboardButton("📞 Контакты", callback_data="show_contacts")]
+    ]
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def legacy_services():
+    keyboard = []
+    for key, service in SERVICES.items():
+        keyboard.append([InlineKeyboardButton(f"{service['name']} - {service['price']}₽",
+                                              callback_data=f"service_{key}")])
+    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_booking")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def legacy_dates(availability, service):
+    keyboard = []
+    today = date.today()
+    for i in range(7):
+        day = today + timedelta(days=i)
+        if day.weekday() < 5:
+            date_str = day.strftime('%d.%m.%Y')
+            if availability.has_capacity(date_str, service['duration']):
+                keyboard.append([InlineKeyboardButton(f"{date_str} ({WEEKDAYS[day.weekday()]})",
+                                                      callback_data=f"date_{date_str}")])
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="quick_book")])
+    text = (f"📅 <b>Выберите дату:</b>\n\n💇 Услуга: <b>{service['name']}</b>\n"
+            f"💰 Стоимость: <b>{service['price']}₽</b>\n⏱ Время: <b>{service['duration']} мин.</b>")
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def legacy_times(availability, date_str, duration):
+    keyboard = []
+    row = []
+    for time_str in availability.free_times(date_str, duration):
+        row.append(InlineKeyboardButton(time_str, callback_data=f"time_{time_str}"))
+        if len(row) == 3:
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="back_to_dates")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def legacy_confirmation(user_data):
+    keyboard = [
+        [InlineKeyboardButton("✅ Подтвердить запись", callback_data="confirm_yes")],
+        [InlineKeyboardButton("✏️ Изменить данные", callback_data="confirm_edit")],
+        [InlineKeyboardButton("❌ Отменить", callback_data="confirm_no")]
+    ]
+    text = (f"📋 <b>ПОДТВЕРЖДЕНИЕ ЗАПИСИ</b>\n\n👤 <b>Имя:</b> {user_data['name']}\n"
+            f"📱 <b>Телефон:</b> {user_data['phone']}\n💇 <b>Услуга:</b> {user_data['service']}\n"
+            f"💰 <b>Стоимость:</b> {user_data['price']}₽\n📅 <b>Дата:</b> {user_data['date']}\n"
+            f"🕒 <b>Время:</b> {user_data['time']}\n\n<i>Все верно? Подтвердите запись</i>")
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def legacy_flow(availability, key, date_str):
+    service = SERVICES[key]
+    legacy_main_menu('Клиент')
+    legacy_services()
+    legacy_dates(availability, service)
+    legacy_times(availability, date_str, service['duration'])
+    legacy_confirmation(USER_DATA)
+
+
+def rendered_flow(renderer, key, date_str):
+    service = SERVICES[key]
+    renderer.welcome('Клиент')
+    renderer.services_menu
+    renderer.choose_date_texts[key]
+    renderer.date_keyboard(service['duration'])
+    renderer.time_keyboard(date_str, service['duration'])
+    renderer.confirmation(USER_DATA)
+
+
+def run(label, flow, args):
+    # Каждые book_every сценариев — запись на один из дней, чтобы кэш
+    # по версии дня честно инвалидировался
+    rng = random.Random(args.seed)
+    availability = AvailabilityIndex()
+    renderer = Renderer(SERVICES, availability)
+    days = [(date.today() + timedelta(days=i)).strftime('%d.%m.%Y') for i in range(7)]
+    keys = list(SERVICES)
+    target = renderer if flow is rendered_flow else availability
+    started = time.perf_counter()
+    for i in range(args.flows):
+        date_str = rng.choice(days)
+        if i % args.book_every == 0:
+            availability.book(date_str, rng.choice(["09:00", "10:00", "14:00", "16:00", "18:00"]), 60)
+        flow(target, rng.choice(keys), date_str)
+    elapsed = time.perf_counter() - started
+    # В сценарии 5 обновлений с отрисовкой: /start, услуги, даты, время, подтверждение
+    per_update = elapsed / (args.flows * 5)
+    print(f"  {label:<18} {elapsed:7.3f} с  {per_update * 1e6:8.1f} мкс на обновление")
+    return per_update
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flows', type=int, default=20000)
+    parser.add_argument('--book-every', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Сценариев записи: {args.flows}, запись в индекс каждые {args.book_every}")
+    before = run('сборка на месте', legacy_flow, args)
+    after = run('Renderer', rendered_flow, args)
+    print(f"\n  ускорение x{before / after:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Бенчмарк движка расписания: месяцы плотных записей, сравнение
+# DaySchedule (бинарный поиск) с линейным перебором интервалов.
+#
+#   python benchmarks/bench_scheduling.py --days 365 --step 15
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduling import DaySchedule, DAY_START, DAY_END, BREAKS
+
+DURATIONS = [40, 45, 60, 90, 120]
+
+
+def naive_is_free(intervals, start, end):
+    if start < DAY_START or end > DAY_END:
+        return False
+    for break_start, break_end in BREAKS:
+        if start < break_end and break_start < end:
+            return False
+    return all(not (start < other_end and other_start < end) for other_start, other_end in intervals)
+
+
+def build(days, step, rng):
+    schedules = []
+    naive = []
+    candidates = list(range(DAY_START, DAY_END, step))
+    for _ in range(days):
+        schedule = DaySchedule()
+        intervals = []
+        for start in candidates:
+            duration = rng.choice(DURATIONS)
+            if schedule.is_free(start, start + duration):
+                schedule.add(start, start + duration)
+                intervals.append((start, start + duration))
+        schedules.append(schedule)
+        naive.append(intervals)
+    return schedules, naive, candidates
+
+
+def timed(label, fn, operations):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000:9.1f} мс  {elapsed / operations * 1e6:7.2f} мкс/операция")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--step', type=int, default=15, help='шаг сетки начала записи, минут')
+    parser.add_argument('--queries', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    schedules, naive, candidates = build(args.days, args.step, rng)
+    total = sum(len(schedule) for schedule in schedules)
+    print(f"Дней: {args.days}, записей: {total}, "
+          f"в среднем {total / args.days:.1f} в день, построение {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    queries = []
+    for _ in range(args.queries):
+        day = rng.randrange(args.days)
+        start = rng.choice(candidates)
+        queries.append((day, start, start + rng.choice(DURATIONS)))
+
+    def run_index():
+        for day, start, end in queries:
+            schedules[day].is_free(start, end)
+
+    def run_naive():
+        for day, start, end in queries:
+            naive_is_free(naive[day], start, end)
+
+    print("\nПроверка «свободен ли интервал»:")
+    fast = timed("DaySchedule.is_free", run_index, len(queries))
+    slow = timed("линейный перебор", run_naive, len(queries))
+    print(f"Ускорение: x{slow / fast:.1f}")
+
+    for day, start, end in queries[:10000]:
+        assert schedules[day].is_free(start, end) == naive_is_free(naive[day], start, end)
+
+    def run_fitting():
+        for schedule in schedules:
+            for duration in DURATIONS:
+                schedule.fitting_starts(candidates, duration)
+
+    print("\nПодбор начала для услуги длительности D:")
+    timed("DaySchedule.fitting_starts", run_fitting, args.days * len(DURATIONS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Поиск /find по FTS5 против LIKE '%...%' на 100 тысячах клиентов и
+# записей.
+#
+#   python benchmarks/bench_search.py --clients 100000
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate
+from search import find
+
+FIRST_NAMES = ["Анна", "Мария", "Елена", "Ольга", "Наталья", "Ирина", "Светлана", "Татьяна", "Юлия", "Дарья",
+               "Алексей", "Дмитрий", "Сергей", "Андрей", "Иван", "Михаил", "Павел", "Николай", "Артем", "Олег"]
+LAST_NAMES = ["Иванова", "Петрова", "Смирнова", "Кузнецова", "Попова", "Соколова", "Лебедева", "Козлова",
+              "Новикова", "Морозова", "Волкова", "Соловьева", "Васильева", "Зайцева", "Павлова", "Семенова"]
+NOTES = ["аллергия на краску", "любит короткие стрижки", "приходит с ребенком", "просит мастера Ольгу",
+         "опаздывает", "оплата картой", "", "", "", ""]
+
+# (описание, запрос /find, эквивалентный LIKE-фрагмент)
+QUERIES = [
+    ("имя целиком", "Мария Зайцева", "%Мария Зайцева%"),
+    ("начало фамилии", "Солов", "%Солов%"),
+    ("начало номера", "8 912 345", "%7912345%"),
+    ("слово из заметки", "аллерг", "%аллерг%"),
+]
+
+
+def fill(conn, count, seed):
+    rng = random.Random(seed)
+    conn.execute("BEGIN")
+    clients = []
+    for i in range(count):
+        phone = 79000000000 + rng.randrange(10 ** 9)
+        clients.append((f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}", phone))
+    conn.executemany("""INSERT OR IGNORE INTO clients (name, phone, phone_e164, visits_count, last_visit)
+                        VALUES (?, '+' || ?, ?, 1, '01.01.2026')""",
+                     [(name, phone, phone) for name, phone in clients])
+    conn.executemany("""INSERT INTO appointments (service, service_key, price, duration, date, time, name, phone,
+                                                 status, notes, day, minute)
+                        VALUES ('💇 Стрижка', 'haircut_woman', 1500, 60, ?, '10:00', ?, ?, 'completed', ?, ?, 600)""",
+                     [(f"{1 + i % 28:02d}.01.2025", name, f"+{phone}", rng.choice(NOTES), f"2025-01-{1 + i % 28:02d}")
+                      for i, (name, phone) in enumerate(clients)])
+    conn.execute("COMMIT")
+
+
+def like(conn, pattern, size):
+    return conn.execute("""SELECT 'client', id, name FROM clients WHERE name LIKE ?1 OR phone LIKE ?1
+                           UNION ALL
+                           SELECT 'appointment', id, name FROM appointments
+                           WHERE name LIKE ?1 OR phone LIKE ?1 OR notes LIKE ?1
+                           LIMIT ?2""", (pattern, size + 1)).fetchall()
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'search.db'), isolation_level=None)
+        migrate(conn)
+        started = time.perf_counter()
+        fill(conn, args.clients, args.seed)
+        print(f"Клиентов и записей: {args.clients}, заполнение с индексацией триггерами: "
+              f"{time.perf_counter() - started:.1f} с\n")
+
+        print(f"{'запрос':<20} {'FTS5, мс':>10} {'LIKE, мс':>10} {'найдено':>8}")
+        for label, text, pattern in QUERIES:
+            fts_time, (rows, _) = timed(lambda: find(conn, text, 1), args.repeat)
+            like_time, _ = timed(lambda: like(conn, pattern, 5), args.repeat)
+            print(f"{label:<20} {fts_time * 1000:10.2f} {like_time * 1000:10.2f} {len(rows):>8}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# Время перезапуска бота: от старта процесса до ответа на первые
+# обновления. База с будущими записями уже мигрирована; процесс бота
+# запускается заново для каждого замера, сеть Bot API подменена.
+# Сравниваются фоновый прогрев кэшей (как в bot.py) и ожидание прогрева
+# до первого обновления.
+#
+#   python benchmarks/bench_startup.py --appointments 15000
+
+import os
+import sys
+import json
+import random
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+PHASES = ('schema', 'accepting_updates', 'first_update', 'first_calendar', 'warm')
+
+
+def prepare(path, count, seed):
+    from migrations import migrate
+    from availability import TIMES
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, isolation_level=None)
+    migrate(conn)
+    today = date.today()
+    slots = [(today + timedelta(days=i), time_str) for i in range(count // len(TIMES) + 1) for time_str in TIMES]
+    rows = []
+    for i, (day, time_str) in enumerate(rng.sample(slots, min(count, len(slots)))):
+        rows.append((day.strftime('%d.%m.%Y'), time_str, f"Клиент {i}", f"+79{i:09d}",
+                     day.isoformat(), int(time_str[:2]) * 60, 100000 + i))
+    conn.execute("BEGIN")
+    conn.executemany("""INSERT INTO appointments (service, service_key, price, duration, date, time, name, phone,
+                                                 status, day, minute, user_id)
+                        VALUES ('💇 Женская стрижка', 'haircut_woman', 1500, 60, ?, ?, ?, ?, 'active', ?, ?, ?)""",
+                     rows)
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def child(eager):
+    # Отдельный процесс: время считается от его старта, с импортами
+    import asyncio
+    import logging
+    import warnings
+
+    logging.disable(logging.INFO)
+    warnings.filterwarnings('ignore', message=".*per_message.*")
+    import bot
+    from fakebot import FakeRequest, message_update, callback_update
+    from metrics import startup_timer
+    from telegram import Update
+    from telegram.ext import Application
+
+    bot.init_db()
+    application = bot.build_application(
+        Application.builder().token(os.environ['BOT_TOKEN']).get_updates_request(FakeRequest()),
+        request=FakeRequest())
+
+    async def lifecycle():
+        await application.initialize()
+        await application.post_init(application)
+        if eager:
+            await application.bot_data['warm_up']
+        for payload in (message_update(1, 7, '/start'), callback_update(2, 7, 'quick_book'),
+                        callback_update(3, 7, 'service_haircut_woman')):
+            await application.process_update(Update.de_json(payload, application.bot))
+        startup_timer.mark('first_calendar')
+        await application.bot_data['warm_up']
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    asyncio.run(lifecycle())
+    print(json.dumps(startup_timer.phases))
+
+
+def measure(db_path, eager, runs):
+    env = dict(os.environ, DB_PATH=db_path, BOT_TOKEN='123:startup', METRICS='1')
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'] + (['--eager'] if eager else []),
+                                env=env, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {phase: sorted(result[phase] for result in results)[len(results) // 2] for phase in PHASES}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--appointments', type=int, default=15000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--child', action='store_true')
+    parser.add_argument('--eager', action='store_true')
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.eager)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'startup.db')
+        prepare(db_path, args.appointments, args.seed)
+        print(f"Будущих записей: {args.appointments}, запусков: {args.runs} (медиана, мс от старта процесса)\n")
+        print(f"{'фаза':<20} {'фоновый прогрев':>16} {'прогрев до работы':>18}")
+        lazy = measure(db_path, False, args.runs)
+        eager = measure(db_path, True, args.runs)
+        for phase in PHASES:
+            print(f"{phase:<20} {lazy[phase] * 1000:16.0f} {eager[phase] * 1000:18.0f}")
+        print(f"\nОт проверки схемы до первого календаря: "
+              f"{(lazy['first_calendar'] - lazy['schema']) * 1000:.0f} мс против "
+              f"{(eager['first_calendar'] - eager['schema']) * 1000:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Пропускная способность: последовательная обработка (как в run_polling)
+# против вебхука с параллельной обработкой по чатам. Записанные обновления
+# отправляются POST-запросами на локальный сервер, Bot API подменен.
+#
+#   python benchmarks/bench_webhook.py --updates 2000 --chats 200 --latency 0.02
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook import ChatOrderedUpdateProcessor, serve
+from fakebot import FakeRequest, message_update
+
+
+def record_updates(count, chats, seed):
+    rng = random.Random(seed)
+    texts = ['/start', 'Анна', '+79123456789', 'Спасибо!']
+    return [message_update(i + 1, rng.randrange(1, chats + 1), rng.choice(texts)) for i in range(count)]
+
+
+def build(latency, processor=None):
+    builder = (Application.builder().token('123:bench')
+               .request(FakeRequest(latency)).get_updates_request(FakeRequest()))
+    if processor:
+        builder = builder.concurrent_updates(processor)
+    application = builder.build()
+    seen = defaultdict(list)
+    done = asyncio.Event()
+    state = {'processed': 0, 'expected': 0}
+
+    async def reply(update: Update, context):
+        seen[update.effective_chat.id].append(update.update_id)
+        # Один вызов Bot API на обновление, как у типичного обработчика
+        await update.message.reply_text('ok')
+        state['processed'] += 1
+        if state['processed'] >= state['expected']:
+            done.set()
+
+    application.add_handler(CommandHandler('start', reply))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, reply))
+    return application, seen, done, state
+
+
+def check_order(seen):
+    for chat_id, update_ids in seen.items():
+        assert update_ids == sorted(update_ids), f"Нарушен порядок в чате {chat_id}"
+
+
+async def run_sequential(payloads, latency):
+    application, seen, done, state = build(latency)
+    state['expected'] = len(payloads)
+    await application.initialize()
+    await application.start()
+    started = time.perf_counter()
+    for payload in payloads:
+        await application.update_queue.put(Update.de_json(payload, application.bot))
+    await done.wait()
+    elapsed = time.perf_counter() - started
+    await application.stop()
+    await application.shutdown()
+    check_order(seen)
+    return elapsed
+
+
+async def run_webhook(payloads, latency, concurrency, port):
+    application, seen, done, state = build(latency, ChatOrderedUpdateProcessor(concurrency))
+    state['expected'] = len(payloads)
+    stop_event = asyncio.Event()
+    server = asyncio.create_task(serve(application, '127.0.0.1', port, 'telegram', stop_event=stop_event))
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        while True:
+            try:
+                if (await client.get('/readyz')).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        # Telegram шлет обновления по одному, не дожидаясь обработки
+        for payload in payloads:
+            response = await client.post('/telegram', json=payload)
+            assert response.status_code == 200
+        await done.wait()
+        elapsed = time.perf_counter() - started
+
+    stop_event.set()
+    await server
+    check_order(seen)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка ответа Bot API, с')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    payloads = record_updates(args.updates, args.chats, args.seed)
+    sequential = asyncio.run(run_sequential(payloads, args.latency))
+    webhook = asyncio.run(run_webhook(payloads, args.latency, args.concurrency, args.port))
+
+    print(f"Обновлений: {args.updates}, чатов: {args.chats}, задержка API: {args.latency * 1000:.0f} мс")
+    print(f"  polling (последовательно): {args.updates / sequential:8.0f} обновлений/с")
+    print(f"  webhook (параллельно):     {args.updates / webhook:8.0f} обновлений/с")
+    print(f"  ускорение: x{sequential / webhook:.1f}; порядок внутри чатов сохранен")
+
+
+if __name__ == '__main__':
+    main()
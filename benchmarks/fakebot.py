@@ -0,0 +1,94 @@
+# Подмена сетевого слоя Bot API для бенчмарков: запросы не уходят в
+# Telegram, а получают готовый ответ (с необязательной задержкой).
+
+import json
+import time
+import asyncio
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+_MESSAGE_METHODS = {'sendMessage', 'editMessageText', 'sendDocument', 'editMessageReplyMarkup'}
+
+
+class FakeRequest(BaseRequest):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.durations = Counter()
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method in _MESSAGE_METHODS:
+            self._message_id += 1
+            chat_id = params.get('chat_id', 0)
+            return {
+                'message_id': params.get('message_id', self._message_id),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        if method == 'getUpdates':
+            return []
+        return True
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        body = json.dumps({'ok': True, 'result': self._result(api_method, params)}).encode()
+        self.durations[api_method] += time.perf_counter() - started
+        return 200, body
+
+
+def user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f"Клиент{user_id}"}
+
+
+def message_update(update_id, user_id, text):
+    entities = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}] if text.startswith('/') else []
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user(user_id),
+            'text': text,
+            'entities': entities,
+        },
+    }
+
+
+def callback_update(update_id, user_id, data, message_id=1):
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': '...',
+            },
+        },
+    }
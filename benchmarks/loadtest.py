@@ -0,0 +1,231 @@
+# Нагрузочный прогон полного сценария записи. Application и обработчики
+# собираются через bot.build_application(), сетевой слой Bot API подменен,
+# обновления подаются в Application.process_update.
+#
+#   python benchmarks/loadtest.py --users 2000 --concurrency 100 --save run.json
+#   python benchmarks/loadtest.py --users 2000 --compare run.json
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MIN_P95_DELTA = 0.002
+
+STEPS = ['start', 'quick_book', 'service', 'date', 'time', 'name', 'phone', 'confirm']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100, help='одновременно активных пользователей')
+    parser.add_argument('--days', type=int, default=60, help='на сколько дней вперед выбирают дату')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа Bot API, с')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='сохранить результат в JSON')
+    parser.add_argument('--compare', help='сравнить с сохраненным результатом')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='допустимый рост p95 и SQL на шаг при сравнении (доля)')
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def working_days(days):
+    today = date.today()
+    result = []
+    for i in range(1, days + 1):
+        day = today + timedelta(days=i)
+        if day.weekday() < 5:
+            result.append(day.strftime('%d.%m.%Y'))
+    return result
+
+
+async def run(args, application, request):
+    import bot
+    from db import query_counter
+    from availability import availability
+    from tenants import tenant_registry, DEFAULT_TENANT
+    from fakebot import message_update, callback_update
+    from telegram import Update
+
+    rng = random.Random(args.seed)
+    dates = working_days(args.days)
+    # Кэши бот прогревает в фоне; настройки салона нужны сценарию сразу
+    await tenant_registry.ensure(bot.db)
+    services = tenant_registry.get(DEFAULT_TENANT).services
+    index = availability.get(DEFAULT_TENANT)
+    service_keys = list(services)
+    latencies = defaultdict(list)
+    queries = defaultdict(Counter)
+    outcomes = Counter()
+    update_ids = iter(range(1, 10 ** 9))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def step(name, payload):
+        counter = Counter()
+        token = query_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            await application.process_update(Update.de_json(payload, application.bot))
+        finally:
+            latencies[name].append(time.perf_counter() - started)
+            query_counter.reset(token)
+            queries[name].update(counter)
+
+    async def user_flow(user_id):
+        async with semaphore:
+            service_key = rng.choice(service_keys)
+            duration = services[service_key]['duration']
+            await step('start', message_update(next(update_ids), user_id, '/start'))
+            await step('quick_book', callback_update(next(update_ids), user_id, 'quick_book'))
+            await step('service', callback_update(next(update_ids), user_id, f"service_{service_key}"))
+            date_str = rng.choice(dates)
+            await step('date', callback_update(next(update_ids), user_id, f"date_{date_str}"))
+            free = index.free_times(date_str, duration)
+            if not free:
+                outcomes['нет свободного времени'] += 1
+                await step('cancel', message_update(next(update_ids), user_id, '/cancel'))
+                return
+            await step('time', callback_update(next(update_ids), user_id, f"time_{rng.choice(free)}"))
+            await step('name', message_update(next(update_ids), user_id, f"Клиент {user_id}"))
+            await step('phone', message_update(next(update_ids), user_id, f"+79{user_id:09d}"))
+            token = application.user_data[user_id].get('booking_token')
+            await step('confirm', callback_update(next(update_ids), user_id, f"confirm_yes:{token}"))
+            row = await bot.db.fetchone("SELECT COUNT(*) FROM appointments WHERE phone = ?",
+                                        (f"+79{user_id:09d}",))
+            outcomes['подтверждено' if row[0] else 'время уже заняли'] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_flow(100000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    booked = (await bot.db.fetchone("SELECT COUNT(*) FROM appointments WHERE status = 'active'"))[0]
+    total_steps = sum(len(values) for values in latencies.values())
+    return {
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'elapsed': elapsed,
+        'updates_per_second': total_steps / elapsed,
+        'conversations_per_second': args.users / elapsed,
+        'booked': booked,
+        'outcomes': dict(outcomes),
+        'api_calls': dict(request.calls),
+        'steps': {
+            name: {
+                'count': len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99),
+                'sql_per_step': sum(queries[name].values()) / len(values),
+                'sql': dict(queries[name]),
+            }
+            for name, values in latencies.items()
+        },
+    }
+
+
+def report(result):
+    print(f"Пользователей: {result['users']}, параллельно: {result['concurrency']}, "
+          f"время: {result['elapsed']:.2f} с")
+    print(f"Пропускная способность: {result['updates_per_second']:.0f} обновлений/с, "
+          f"{result['conversations_per_second']:.0f} диалогов/с")
+    print(f"Итог: {result['outcomes']}, активных записей в базе: {result['booked']}")
+    print(f"\n{'шаг':<12}{'кол-во':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'SQL/шаг':>9}")
+    for name in STEPS + ['cancel']:
+        stats = result['steps'].get(name)
+        if not stats:
+            continue
+        print(f"{name:<12}{stats['count']:>8}{stats['p50'] * 1000:>10.2f}{stats['p95'] * 1000:>10.2f}"
+              f"{stats['p99'] * 1000:>10.2f}{stats['sql_per_step']:>9.2f}")
+    print(f"\nВызовы Bot API: {result['api_calls']}")
+
+
+def compare(result, baseline, threshold):
+    # Регрессия — рост p95 или числа запросов на шаг больше порога
+    print(f"\nСравнение с базовым прогоном ({baseline['users']} пользователей):")
+    regressions = []
+    print(f"{'шаг':<12}{'p95 было':>10}{'p95 стало':>11}{'SQL было':>10}{'SQL стало':>11}")
+    for name, stats in result['steps'].items():
+        old = baseline['steps'].get(name)
+        if not old:
+            continue
+        print(f"{name:<12}{old['p95'] * 1000:>10.2f}{stats['p95'] * 1000:>11.2f}"
+              f"{old['sql_per_step']:>10.2f}{stats['sql_per_step']:>11.2f}")
+        # Абсолютный порог отсекает шум на шагах в доли миллисекунды
+        if stats['p95'] > old['p95'] * (1 + threshold) and stats['p95'] - old['p95'] > MIN_P95_DELTA:
+            regressions.append(f"{name}: p95 {old['p95'] * 1000:.2f} -> {stats['p95'] * 1000:.2f} мс")
+        if stats['sql_per_step'] > old['sql_per_step'] * (1 + threshold) + 1e-9:
+            regressions.append(f"{name}: SQL/шаг {old['sql_per_step']:.2f} -> {stats['sql_per_step']:.2f}")
+    ratio = result['updates_per_second'] / baseline['updates_per_second']
+    print(f"Пропускная способность: x{ratio:.2f}")
+    if ratio < 1 - threshold:
+        regressions.append(f"пропускная способность упала в {1 / ratio:.2f} раза")
+    for line in regressions:
+        print(f"РЕГРЕССИЯ: {line}")
+    return not regressions
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DB_PATH'] = os.path.join(tmp, 'loadtest.db')
+        os.environ.setdefault('BOT_TOKEN', '123:loadtest')
+        import logging
+        import warnings
+        import bot
+        import render
+        from fakebot import FakeRequest
+        from telegram.ext import Application
+
+        logging.getLogger().setLevel(logging.WARNING)
+        warnings.filterwarnings('ignore', message=".*per_message.*")
+        # Бот принимает только даты из календаря; растягиваем его на --days,
+        # чтобы пользователям хватало свободного времени
+        render.CALENDAR_DAYS = args.days + 1
+        bot.init_db()
+        request = FakeRequest(args.latency)
+        application = bot.build_application(
+            Application.builder().token(os.environ['BOT_TOKEN']).get_updates_request(FakeRequest()),
+            request=request)
+
+        async def lifecycle():
+            await application.initialize()
+            await application.post_init(application)
+            try:
+                return await run(args, application, request)
+            finally:
+                await application.shutdown()
+                await application.post_shutdown(application)
+
+        result = asyncio.run(lifecycle())
+
+    report(result)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
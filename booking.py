@@ -0,0 +1,64 @@
+import sqlite3
+from datetime import datetime
+
+from scheduling import DaySchedule, DEFAULT_HOURS, to_minutes, iso_day
+from tenants import DEFAULT_TENANT
+from clients import normalize_phone
+
+
+class SlotTakenError(Exception):
+    # Выбранное время уже занято другой активной записью
+    pass
+
+
+def upsert_client(conn, name, phone, amount_spent, user_id=None):
+    # Клиент ищется по номеру в E.164; user_id переходит к последнему
+    # номеру, с которым пользователь записывался
+    today = datetime.now().strftime('%d.%m.%Y')
+    phone_e164 = normalize_phone(phone)
+    if user_id is not None:
+        conn.execute("UPDATE clients SET user_id = NULL WHERE user_id = ? AND phone_e164 IS NOT ?",
+                     (user_id, phone_e164))
+    conn.execute('''INSERT INTO clients (phone, phone_e164, user_id, name, visits_count, last_visit, total_spent)
+                    VALUES (?, ?, ?, ?, 1, ?, ?)
+                    ON CONFLICT(phone_e164) DO UPDATE SET
+                        phone = excluded.phone,
+                        user_id = COALESCE(excluded.user_id, clients.user_id),
+                        name = excluded.name,
+                        visits_count = clients.visits_count + 1,
+                        last_visit = excluded.last_visit,
+                        total_spent = clients.total_spent + excluded.total_spent''',
+                 (phone, phone_e164, user_id, name, today, amount_spent))
+
+
+def create_booking(conn, data, hours=DEFAULT_HOURS, day_capacity=None):
+    # Проверка пересечения и вместимости дня салона, вставка записи и
+    # обновление клиента. Вызывается внутри db.transaction (BEGIN IMMEDIATE),
+    # поэтому между проверкой и вставкой никто другой записать не может —
+    # в том числе другие процессы бота.
+    start = to_minutes(data['time'])
+    end = start + data['duration']
+    tenant_id = data.get('tenant_id', DEFAULT_TENANT)
+
+    schedule = DaySchedule(hours)
+    rows = conn.execute("""SELECT minute, duration FROM appointments
+                           WHERE tenant_id = ? AND day = ? AND status = 'active'""",
+                        (tenant_id, iso_day(data['date']))).fetchall()
+    for other_start, duration in rows:
+        schedule.add(other_start, other_start + (duration or 60))
+    if (day_capacity is not None and len(rows) >= day_capacity) or not schedule.is_free(start, end):
+        raise SlotTakenError(f"{data['date']} {data['time']}")
+
+    try:
+        cursor = conn.execute("""INSERT INTO appointments
+                       (service, service_key, price, duration, date, time, name, phone, day, minute, user_id,
+                        tenant_id)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                       (data['service'], data['service_key'], data['price'], data['duration'],
+                        data['date'], data['time'], data['name'], data['phone'],
+                        iso_day(data['date']), start, data.get('user_id'), tenant_id))
+    except sqlite3.IntegrityError:
+        # Уникальный индекс по активным (tenant_id, date, time)
+        raise SlotTakenError(f"{data['date']} {data['time']}")
+    upsert_client(conn, data['name'], data['phone'], data['price'], data.get('user_id'))
+    return cursor.lastrowid
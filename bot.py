@@ -1,10 +1,33 @@
 import os
+import asyncio
+import secrets
 import logging
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, ContextTypes, CallbackQueryHandler
-import sqlite3
-from datetime import datetime, timedelta
-import re
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, ContextTypes, CallbackQueryHandler, TypeHandler
+from telegram.request import HTTPXRequest
+from datetime import datetime
+
+from db import db
+from availability import availability
+from booking import create_booking, SlotTakenError
+from migrations import ensure_schema
+from outbox import enqueue, dispatcher as outbox_dispatcher
+from webhook import ChatOrderedUpdateProcessor, serve, start_metrics_server
+from flood import flood_guard
+from metrics import (METRICS_ENABLED, instrument_application, instrument_request, observe_query,
+                     count_callback_error, summary_logger, startup_timer)
+from persistence import SQLitePersistence
+from reminders import reminders
+from maintenance import maintenance
+import stats
+import clients
+from reviews import review_pending, insert_review, page as review_page, ratings
+from search import find as search_find, PAGE_SIZE as FIND_PAGE_SIZE
+from export import export_table, FORMATS as EXPORT_FORMATS, TABLES as EXPORT_TABLES
+from scheduling import iso_day, to_minutes, from_minutes
+from render import CHOOSE_SERVICE_TEXT, CHOOSE_TIME_TEMPLATE, BACK_TO_DATES_TEMPLATE
+from tenants import tenant_registry, is_owner, DEFAULT_TENANT
+import workers
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,107 +44,64 @@ if not BOT_TOKEN:
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN environment variable is not set")
 
-# Конфигурация
-MASTER_PHONE = "+79507050964"
-MASTER_CHAT_ID = None
+# Режим работы: polling (по умолчанию) или webhook
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+PORT = int(os.environ.get('PORT', '8080'))
+CONCURRENT_UPDATES = int(os.environ.get('CONCURRENT_UPDATES', '32'))
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
 
 # Состояния разговора
 SERVICE, DATE, TIME, NAME, PHONE, CONFIRM = range(6)
 
-# База услуг с детализацией
-SERVICES = {
-    "haircut_woman": {"name": "💇 Женская стрижка", "price": 1500, "duration": 60},
-    "haircut_man": {"name": "💇‍♂️ Мужская стрижка", "price": 800, "duration": 45},
-    "haircut_child": {"name": "👧 Детская стрижка", "price": 700, "duration": 40},
-    "coloring": {"name": "🎨 Окрашивание", "price": 2500, "duration": 120},
-    "complex": {"name": "✨ Комплекс (стрижка+укладка)", "price": 2200, "duration": 90}
-}
+# Салон пользователя: выбирается ссылкой /start <slug> или в /salons.
+# Услуги, часы работы, мастер и готовые клавиатуры — в TenantConfig.
+def tenant(context: ContextTypes.DEFAULT_TYPE):
+    return tenant_registry.get(context.user_data.get('tenant_id', DEFAULT_TENANT))
 
 # Инициализация базы данных
 def init_db():
-    conn = sqlite3.connect('appointments.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS appointments
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  service TEXT,
-                  service_key TEXT,
-                  price INTEGER,
-                  duration INTEGER,
-                  date TEXT,
-                  time TEXT,
-                  name TEXT,
-                  phone TEXT,
-                  status TEXT DEFAULT 'active',
-                  notes TEXT,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS clients
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  phone TEXT UNIQUE,
-                  name TEXT,
-                  visits_count INTEGER DEFAULT 0,
-                  last_visit TEXT,
-                  total_spent INTEGER DEFAULT 0,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS reviews
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  client_name TEXT,
-                  phone TEXT,
-                  rating INTEGER,
-                  text TEXT,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    conn.commit()
-    conn.close()
-
-# Обновляем информацию о клиенте
-def update_client_info(name, phone, amount_spent):
-    conn = sqlite3.connect('appointments.db')
-    cursor = conn.cursor()
-    
-    today = datetime.now().strftime('%d.%m.%Y')
-    
-    cursor.execute('''INSERT OR REPLACE INTO clients 
-                    (phone, name, visits_count, last_visit, total_spent)
-                    VALUES (?, ?, 
-                    COALESCE((SELECT visits_count FROM clients WHERE phone = ?), 0) + 1,
-                    ?, 
-                    COALESCE((SELECT total_spent FROM clients WHERE phone = ?), 0) + ?)''',
-                    (phone, name, phone, today, phone, amount_spent))
-    
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        ensure_schema(conn)
+    startup_timer.mark('schema')
+
+# Перед любым обработчиком: время до первого обновления и настройки салонов,
+# если фоновый прогрев еще не успел их загрузить
+async def before_update(update: object, context: ContextTypes.DEFAULT_TYPE):
+    startup_timer.mark('first_update')
+    await tenant_registry.ensure(db)
+    # Любая команда отменяет ожидание отзыва
+    if update.message and update.message.text and update.message.text.startswith('/'):
+        review_pending.discard(update.effective_user.id)
 
 # Команда /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = update.effective_user
-    
-    welcome_text = (
-        f"👋 <b>Добро пожаловать, {user.first_name}!</b>\n\n"
-        f"✨ <b>Салон красоты 'Ольга Карре'</b>\n\n"
-        "💫 <b>Мы предлагаем:</b>\n"
-        "• Профессиональные стрижки\n"
-        "• Модное окрашивание\n"
-        "• Стильные укладки\n\n"
-        "📋 <b>Основные команды:</b>\n"
-        "• /book - 📝 Новая запись\n"
-        "• /my_bookings - 📋 Мои записи\n"
-        "• /services - 💰 Услуги и цены\n"
-        "• /reviews - ⭐ Отзывы\n"
-        "• /contacts - 📞 Контакты"
-    )
-    
-    keyboard = [
-        [InlineKeyboardButton("📝 Записаться онлайн", callback_data="quick_book")],
-        [InlineKeyboardButton("💰 Услуги и цены", callback_data="show_services")],
-        [InlineKeyboardButton("⭐ Оставить отзыв", callback_data="leave_review")],
-        [InlineKeyboardButton("📞 Контакты", callback_data="show_contacts")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(welcome_text, reply_markup=reply_markup, parse_mode='HTML')
+    if context.args:
+        config = tenant_registry.by_slug(context.args[0])
+        if config is not None:
+            context.user_data['tenant_id'] = config.id
+    config = tenant(context)
+    await update.message.reply_text(config.renderer.welcome(update.effective_user.first_name),
+                                    reply_markup=config.renderer.main_menu, parse_mode='HTML')
+
+# Команда /salons — выбор салона
+async def salons(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    current = tenant(context)
+    keyboard = [[InlineKeyboardButton(f"{'✅ ' if config is current else ''}{config.name}",
+                                      callback_data=f"salon_{config.id}")]
+                for config in tenant_registry.all()]
+    await update.message.reply_text("🏠 <b>Выберите салон:</b>", reply_markup=InlineKeyboardMarkup(keyboard),
+                                    parse_mode='HTML')
+
+async def salon_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    config = tenant_registry.get(int(query.data.replace('salon_', '')))
+    context.user_data['tenant_id'] = config.id
+    await query.edit_message_text(config.renderer.welcome(update.effective_user.first_name),
+                                  reply_markup=config.renderer.main_menu, parse_mode='HTML')
 
 # Обработка callback queries для главного меню
 async def handle_main_menu_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -148,6 +128,7 @@ async def handle_main_menu_callbacks(update: Update, context: ContextTypes.DEFAU
             await leave_review_callback(update, context)
     except Exception as e:
         logger.error(f"Ошибка в обработчике callback: {e}")
+        count_callback_error(query.data)
         if query:
             await query.edit_message_text("❌ Произошла ошибка. Попробуйте еще раз.")
 
@@ -162,28 +143,19 @@ async def quick_book_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         message = update.message
     
     logger.info("Начало процесса записи")
-    
-    # Создаем клавиатуру с услугами
-    keyboard = []
-    for key, service in SERVICES.items():
-        btn_text = f"{service['name']} - {service['price']}₽"
-        keyboard.append([InlineKeyboardButton(btn_text, callback_data=f"service_{key}")])
-    
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_booking")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    text = "✨ <b>Выберите услугу:</b>"
+    review_pending.discard(update.effective_user.id)
+    renderer = tenant(context).renderer
     
     if update.callback_query:
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(CHOOSE_SERVICE_TEXT, reply_markup=renderer.services_menu, parse_mode='HTML')
     else:
-        await message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        await message.reply_text(CHOOSE_SERVICE_TEXT, reply_markup=renderer.services_menu, parse_mode='HTML')
     
     return SERVICE
 
 # Команда /book
 async def book_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await quick_book_handler(update, context)
+    return await quick_book_handler(update, context)
 
 # Обработка выбора услуги
 async def service_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -191,7 +163,11 @@ async def service_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     service_key = query.data.replace('service_', '')
-    service = SERVICES[service_key]
+    config = tenant(context)
+    service = config.services.get(service_key)
+    if service is None:
+        # Услугу убрали, пока клиент смотрел старую клавиатуру
+        return await quick_book_handler(update, context)
     
     context.user_data['service'] = service['name']
     context.user_data['service_key'] = service_key
@@ -199,36 +175,10 @@ async def service_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['duration'] = service['duration']
     
     # Показываем календарь на 7 дней
-    keyboard = []
-    today = datetime.now().date()
-    
-    for i in range(7):
-        date = today + timedelta(days=i)
-        if date.weekday() < 5:  # Только рабочие дни (Пн-Пт)
-            date_str = date.strftime('%d.%m.%Y')
-            weekday = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"][date.weekday()]
-            
-            # Проверяем доступность даты
-            conn = sqlite3.connect('appointments.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM appointments WHERE date = ? AND status = 'active'", (date_str,))
-            appointment_count = cursor.fetchone()[0]
-            conn.close()
-            
-            # Максимум 8 записей в день
-            if appointment_count < 8:
-                btn_text = f"{date_str} ({weekday})"
-                keyboard.append([InlineKeyboardButton(btn_text, callback_data=f"date_{date_str}")])
-    
-    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="quick_book")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    await availability.ensure(db, config.id)
     await query.edit_message_text(
-        f"📅 <b>Выберите дату:</b>\n\n"
-        f"💇 Услуга: <b>{service['name']}</b>\n"
-        f"💰 Стоимость: <b>{service['price']}₽</b>\n"
-        f"⏱ Время: <b>{service['duration']} мин.</b>",
-        reply_markup=reply_markup,
+        config.renderer.choose_date_texts[service_key],
+        reply_markup=config.renderer.date_keyboard(service['duration']),
         parse_mode='HTML'
     )
     return DATE
@@ -242,37 +192,22 @@ async def date_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await quick_book_handler(update, context)
     
     date_str = query.data.replace('date_', '')
+    config = tenant(context)
+    await availability.ensure(db, config.id)
+    if not config.renderer.in_calendar(date_str):
+        # Кнопка из старого сообщения: день уже прошел или это не дата
+        await query.edit_message_text(
+            "⚠️ Эта дата уже недоступна.\n\n" + BACK_TO_DATES_TEMPLATE.format(service=context.user_data['service']),
+            reply_markup=config.renderer.date_keyboard(context.user_data.get('duration', 60)),
+            parse_mode='HTML'
+        )
+        return DATE
     context.user_data['date'] = date_str
     
     # Показываем доступное время
-    keyboard = []
-    times = ["09:00", "10:00", "11:00", "12:00", "14:00", "15:00", "16:00", "17:00", "18:00", "19:00"]
-    
-    # Проверяем занятые времена
-    conn = sqlite3.connect('appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT time FROM appointments WHERE date = ? AND status = 'active'", (date_str,))
-    busy_times = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    
-    row = []
-    for time in times:
-        if time not in busy_times:
-            row.append(InlineKeyboardButton(time, callback_data=f"time_{time}"))
-            if len(row) == 3:
-                keyboard.append(row)
-                row = []
-    
-    if row:
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="back_to_dates")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await query.edit_message_text(
-        f"🕒 <b>Выберите время на {date_str}:</b>\n"
-        f"Услуга: <b>{context.user_data['service']}</b>",
-        reply_markup=reply_markup,
+        CHOOSE_TIME_TEMPLATE.format(date=date_str, service=context.user_data['service']),
+        reply_markup=config.renderer.time_keyboard(date_str, context.user_data.get('duration', 60)),
         parse_mode='HTML'
     )
     return TIME
@@ -284,37 +219,15 @@ async def time_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if query.data == "back_to_dates":
         # Возвращаемся к выбору даты
-        service_key = context.user_data.get('service_key')
-        if service_key:
-            service = SERVICES[service_key]
+        config = tenant(context)
+        service = config.services.get(context.user_data.get('service_key'))
+        if service:
             context.user_data['service'] = service['name']
         
-        keyboard = []
-        today = datetime.now().date()
-        
-        for i in range(7):
-            date = today + timedelta(days=i)
-            if date.weekday() < 5:
-                date_str = date.strftime('%d.%m.%Y')
-                weekday = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"][date.weekday()]
-                
-                conn = sqlite3.connect('appointments.db')
-                cursor = conn.cursor()
-                cursor.execute("SELECT COUNT(*) FROM appointments WHERE date = ? AND status = 'active'", (date_str,))
-                appointment_count = cursor.fetchone()[0]
-                conn.close()
-                
-                if appointment_count < 8:
-                    btn_text = f"{date_str} ({weekday})"
-                    keyboard.append([InlineKeyboardButton(btn_text, callback_data=f"date_{date_str}")])
-        
-        keyboard.append([InlineKeyboardButton("◀️ Назад к услугам", callback_data="quick_book")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+        await availability.ensure(db, config.id)
         await query.edit_message_text(
-            f"📅 <b>Выберите дату:</b>\n\n"
-            f"💇 Услуга: <b>{context.user_data['service']}</b>",
-            reply_markup=reply_markup,
+            BACK_TO_DATES_TEMPLATE.format(service=context.user_data['service']),
+            reply_markup=config.renderer.date_keyboard(context.user_data.get('duration', 60), back_text="◀️ Назад к услугам"),
             parse_mode='HTML'
         )
         return DATE
@@ -322,6 +235,15 @@ async def time_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     time_str = query.data.replace('time_', '')
     context.user_data['time'] = time_str
     
+    # Постоянный клиент: имя и телефон уже известны, сразу к подтверждению
+    client = None if context.user_data.get('edit_contact') else await clients.lookup(db, update.effective_user.id)
+    if client:
+        context.user_data['name'], context.user_data['phone'] = client
+        text, reply_markup = confirmation_message(context)
+        await context.bot.send_message(
+            chat_id=query.message.chat_id, text=text, reply_markup=reply_markup, parse_mode='HTML')
+        return CONFIRM
+    
     # Вместо edit_message_text используем send_message для нового сообщения
     await context.bot.send_message(
         chat_id=query.message.chat_id,
@@ -345,9 +267,9 @@ async def name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     phone = update.message.text.strip()
     
-    # Проверка формата телефона
-    phone_clean = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-    if not re.match(r'^(\+7|8|7)?\d{10}$', phone_clean):
+    # Проверка формата и нормализация телефона в E.164
+    phone_e164 = clients.normalize_phone(phone)
+    if phone_e164 is None:
         await update.message.reply_text(
             "❌ <b>Неверный формат телефона!</b>\n\n"
             "Введите номер в формате:\n"
@@ -356,38 +278,41 @@ async def phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return PHONE
     
-    # Нормализация телефона
-    if phone_clean.startswith('8'):
-        phone = '+7' + phone_clean[1:]
-    elif phone_clean.startswith('7'):
-        phone = '+' + phone_clean
-    elif not phone_clean.startswith('+7'):
-        phone = '+7' + phone_clean
-    
-    context.user_data['phone'] = phone
+    context.user_data['phone'] = clients.format_phone(phone_e164)
     
     # Подтверждение записи
-    keyboard = [
-        [InlineKeyboardButton("✅ Подтвердить запись", callback_data="confirm_yes")],
-        [InlineKeyboardButton("✏️ Изменить данные", callback_data="confirm_edit")],
-        [InlineKeyboardButton("❌ Отменить", callback_data="confirm_no")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    appointment_text = (
-        "📋 <b>ПОДТВЕРЖДЕНИЕ ЗАПИСИ</b>\n\n"
-        f"👤 <b>Имя:</b> {context.user_data['name']}\n"
-        f"📱 <b>Телефон:</b> {phone}\n"
-        f"💇 <b>Услуга:</b> {context.user_data['service']}\n"
-        f"💰 <b>Стоимость:</b> {context.user_data['price']}₽\n"
-        f"📅 <b>Дата:</b> {context.user_data['date']}\n"
-        f"🕒 <b>Время:</b> {context.user_data['time']}\n\n"
-        "<i>Все верно? Подтвердите запись</i>"
-    )
-    
-    await update.message.reply_text(appointment_text, reply_markup=reply_markup, parse_mode='HTML')
+    text, reply_markup = confirmation_message(context)
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
     return CONFIRM
 
+def confirmation_message(context):
+    # Новый токен на каждое подтверждение: повторное или устаревшее
+    # нажатие «Подтвердить» не создаст вторую запись
+    context.user_data['booking_token'] = secrets.token_hex(4)
+    return tenant(context).renderer.confirmation(context.user_data)
+
+# Уведомление мастеру о новой записи
+def master_booking_text(appointment_id, data):
+    return (
+        "🔔 <b>НОВАЯ ЗАПИСЬ!</b>\n\n"
+        f"📋 <b>ID:</b> #{appointment_id}\n"
+        f"👤 <b>Клиент:</b> {data['name']}\n"
+        f"📱 <b>Телефон:</b> {data['phone']}\n"
+        f"💇 <b>Услуга:</b> {data['service']}\n"
+        f"💰 <b>Стоимость:</b> {data['price']}₽\n"
+        f"📅 <b>Дата:</b> {data['date']}\n"
+        f"🕒 <b>Время:</b> {data['time']}\n\n"
+        f"⏰ Создано: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
+    )
+
+def book_and_notify(conn, data, config):
+    appointment_id = create_booking(conn, data, config.hours, config.day_capacity)
+    stats.record_booking(conn, config.id, iso_day(data['date']), data['service_key'], data['price'])
+    # Без мастера (tenants.master_chat_id или OWNER_CHAT_ID) уведомлять некого
+    if config.master_chat_id:
+        enqueue(conn, None, master_booking_text(appointment_id, data), tenant_id=config.id)
+    return appointment_id
+
 # Подтверждение записи
 async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -398,51 +323,43 @@ async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     if query.data == "confirm_edit":
+        # Имя и телефон спросим заново, даже если клиент уже известен
+        context.user_data['edit_contact'] = True
         await query.edit_message_text("✏️ <b>Начнем запись заново:</b>", parse_mode='HTML')
         return await quick_book_handler(update, context)
     
-    # Сохранение в базу данных
-    conn = sqlite3.connect('appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("""INSERT INTO appointments 
-                   (service, service_key, price, duration, date, time, name, phone) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                   (context.user_data['service'], context.user_data['service_key'],
-                    context.user_data['price'], context.user_data['duration'],
-                    context.user_data['date'], context.user_data['time'],
-                    context.user_data['name'], context.user_data['phone']))
-    appointment_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    
-    # Обновляем информацию о клиенте
-    update_client_info(context.user_data['name'], context.user_data['phone'], context.user_data['price'])
-    
-    # Уведомление для мастера
-    master_text = (
-        "🔔 <b>НОВАЯ ЗАПИСЬ!</b>\n\n"
-        f"📋 <b>ID:</b> #{appointment_id}\n"
-        f"👤 <b>Клиент:</b> {context.user_data['name']}\n"
-        f"📱 <b>Телефон:</b> {context.user_data['phone']}\n"
-        f"💇 <b>Услуга:</b> {context.user_data['service']}\n"
-        f"💰 <b>Стоимость:</b> {context.user_data['price']}₽\n"
-        f"📅 <b>Дата:</b> {context.user_data['date']}\n"
-        f"🕒 <b>Время:</b> {context.user_data['time']}\n\n"
-        f"⏰ Создано: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-    )
+    token = query.data.partition(':')[2]
+    if not token or token != context.user_data.pop('booking_token', None):
+        await query.edit_message_text("ℹ️ Эта запись уже оформлена или устарела.\n\n📋 Мои записи: /my_bookings")
+        return ConversationHandler.END
     
-    # Отправляем уведомление мастеру
-    global MASTER_CHAT_ID
-    if MASTER_CHAT_ID:
-        try:
-            app = context.application
-            await app.bot.send_message(
-                chat_id=MASTER_CHAT_ID,
-                text=master_text,
-                parse_mode='HTML'
-            )
-        except Exception as e:
-            logger.error(f"Не удалось отправить уведомление мастеру: {e}")
+    # Проверка слота, запись, обновление клиента и уведомление мастеру —
+    # одна транзакция; само уведомление отправит фоновый dispatcher
+    config = tenant(context)
+    try:
+        booking = dict(context.user_data, user_id=update.effective_user.id, tenant_id=config.id)
+        appointment_id = await db.transaction(book_and_notify, booking, config, label='create_booking')
+    except SlotTakenError:
+        # Слот мог занять другой процесс бота — перечитываем день из базы
+        await availability.refresh_day(db, config.id, context.user_data['date'])
+        keyboard = [[InlineKeyboardButton("🕒 Выбрать другое время", callback_data=f"date_{context.user_data['date']}")]]
+        await query.edit_message_text(
+            "⚠️ <b>Это время только что заняли.</b>\n\nПожалуйста, выберите другое время.",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='HTML'
+        )
+        return DATE
+    except Exception:
+        # Ничего не записано (например, база занята) — повторное нажатие
+        # должно оформить запись, а не ответить «уже оформлена»
+        context.user_data['booking_token'] = token
+        raise
+    availability.get(config.id).book(context.user_data['date'], context.user_data['time'],
+                                     context.user_data['duration'])
+    reminders.add(appointment_id, iso_day(context.user_data['date']), to_minutes(context.user_data['time']))
+    outbox_dispatcher.wake()
+    context.user_data.pop('edit_contact', None)
+    clients.cache.put(update.effective_user.id, (context.user_data['name'], context.user_data['phone']))
     
     # Подтверждение клиенту
     success_text = (
@@ -455,8 +372,8 @@ async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"• Время: {context.user_data['time']}\n"
         f"• Имя: {context.user_data['name']}\n"
         f"• Телефон: {context.user_data['phone']}\n\n"
-        "📍 <b>Адрес:</b> г. Москва, ул. Красивая, д. 15\n"
-        "📱 <b>Контакты:</b> +79507050964\n\n"
+        f"📍 <b>Адрес:</b> {config.address}\n"
+        f"📱 <b>Контакты:</b> {config.master_phone}\n\n"
         "💡 <b>Важная информация:</b>\n"
         "• Отмена возможна за 2 часа до приема\n"
         "• Оплата наличными или картой\n"
@@ -474,22 +391,398 @@ async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.edit_message_text(success_text, reply_markup=reply_markup, parse_mode='HTML')
     
-    # Сохраняем chat_id мастера
-    if context.user_data['phone'] == MASTER_PHONE and not MASTER_CHAT_ID:
-        MASTER_CHAT_ID = update.effective_user.id
-        logger.info(f"Master chat_id saved: {MASTER_CHAT_ID}")
+    return ConversationHandler.END
+
+# Команда /cancel_booking ID
+async def cancel_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args or not context.args[0].lstrip('#').isdigit():
+        await update.message.reply_text(
+            "ℹ️ Укажите номер записи: /cancel_booking ID",
+            parse_mode='HTML'
+        )
+        return
+    
+    appointment_id = int(context.args[0].lstrip('#'))
+    # Клиент отменяет только свои записи, мастер — любые записи своего салона
+    config = master_tenant(update)
+    master_tenant_id = config.id if config else None
+    
+    def cancel_in_db(conn):
+        row = conn.execute("""SELECT date, time, duration, day, service_key, price, tenant_id FROM appointments
+                              WHERE id = ? AND status = 'active' AND (user_id = ? OR tenant_id = ?)""",
+                           (appointment_id, update.effective_user.id, master_tenant_id)).fetchone()
+        if row:
+            conn.execute("UPDATE appointments SET status = 'cancelled' WHERE id = ?", (appointment_id,))
+            stats.record_cancellation(conn, row[6], row[3], row[4], row[5])
+        return row
+    
+    row = await db.transaction(cancel_in_db, label='cancel_appointment')
+    if not row:
+        await update.message.reply_text(f"❌ Активная запись #{appointment_id} не найдена")
+        return
     
+    availability.get(row[6]).release(row[0], row[1], row[2] or 60)
+    reminders.remove(appointment_id)
+    await update.message.reply_text(
+        f"✅ <b>Запись #{appointment_id} отменена</b>\n\n"
+        f"📅 {row[0]} 🕒 {row[1]}",
+        parse_mode='HTML'
+    )
+
+# Отмена диалога записи
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    review_pending.discard(update.effective_user.id)
+    if update.callback_query:
+        await update.callback_query.answer()
+        await update.callback_query.edit_message_text("❌ Запись отменена")
+    else:
+        await update.message.reply_text("❌ Запись отменена", reply_markup=ReplyKeyboardRemove())
     return ConversationHandler.END
 
-# Остальные функции (show_services_callback, show_contacts_callback, и т.д.) остаются без изменений
-# ...
+# Услуги и цены
+def services_text(config):
+    lines = ["💰 <b>Услуги и цены:</b>\n"]
+    for service in config.services.values():
+        lines.append(f"{service['name']}\n   {service['price']}₽ · {service['duration']} мин.")
+    lines.append("\n📝 Записаться: /book")
+    return "\n".join(lines)
 
-def main():
-    # Инициализация базы данных
-    init_db()
+async def show_services(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(services_text(tenant(context)), parse_mode='HTML')
+
+async def show_services_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    keyboard = [[InlineKeyboardButton("📝 Записаться онлайн", callback_data="quick_book")]]
+    await update.callback_query.edit_message_text(
+        services_text(tenant(context)), reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+
+# Контакты
+def contacts_text(config):
+    return (
+        "📞 <b>Контакты</b>\n\n"
+        f"🏠 <b>{config.name}</b>\n"
+        f"📍 <b>Адрес:</b> {config.address}\n"
+        f"📱 <b>Телефон:</b> {config.master_phone}\n"
+        f"🕒 <b>Часы работы:</b> Пн-Пт {from_minutes(config.hours.start)}-{from_minutes(config.hours.end)}"
+    )
+
+async def show_contacts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(contacts_text(tenant(context)), parse_mode='HTML')
+
+async def show_contacts_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text(contacts_text(tenant(context)), parse_mode='HTML')
+
+# Отзывы
+async def leave_review_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Следующее текстовое сообщение пользователя — отзыв
+    review_pending.add(update.effective_user.id)
+    await update.callback_query.edit_message_text(
+        "⭐ <b>Оставьте отзыв</b>\n\n"
+        "Напишите пару слов о визите. Можно начать с оценки от 1 до 5.\n"
+        "<i>Например: 5 Отличная стрижка, спасибо!</i>",
+        parse_mode='HTML'
+    )
+
+async def handle_review(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Сюда попадают только сообщения, прошедшие фильтр review_pending
+    review_pending.discard(update.effective_user.id)
+    text = update.message.text.strip()
+    rating = None
+    if text and text[0] in "12345":
+        rating = int(text[0])
+        text = text[1:].strip()
+    
+    await db.transaction(insert_review, update.effective_user.first_name, context.user_data.get('phone'),
+                         rating, text, label='insert_review')
+    ratings.add(rating)
+    await update.message.reply_text("💫 <b>Спасибо за отзыв!</b>", parse_mode='HTML')
+
+async def reviews_page_text(cursor=None, direction='older'):
+    rating = await ratings.get(db)
+    rows, has_newer, has_older = await db.run(review_page, cursor, direction, label='reviews_page')
+    if not rows:
+        return "⭐ Отзывов пока нет. Будьте первым!", None
+    
+    lines = ["⭐ <b>Отзывы клиентов</b>\n"]
+    if rating.count:
+        lines.append(f"Средняя оценка: <b>{rating.average:.1f}</b> из 5 ({rating.count} оценок)")
+        for stars in range(5, 0, -1):
+            lines.append(f"{'⭐' * stars}: {rating.histogram[stars - 1]}")
+        lines.append("")
+    for review_id, client_name, stars, text in rows:
+        lines.append(f"<b>{client_name}</b> {'⭐' * stars if stars else ''}\n{text}\n")
+    
+    buttons = []
+    if has_newer:
+        buttons.append(InlineKeyboardButton("◀️ Новее", callback_data=f"reviews_newer_{rows[0][0]}"))
+    if has_older:
+        buttons.append(InlineKeyboardButton("Старее ▶️", callback_data=f"reviews_older_{rows[-1][0]}"))
+    return "\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def show_reviews(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text, reply_markup = await reviews_page_text()
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
+
+async def reviews_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    _, direction, cursor = query.data.split('_')
+    text, reply_markup = await reviews_page_text(int(cursor), direction)
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+
+# Мои записи: один диапазонный запрос по индексу (user_id, day)
+async def my_bookings_text(user_id):
+    rows = await db.fetchall("""SELECT id, service, date, time FROM appointments
+                                WHERE user_id = ? AND status = 'active' AND day >= ?
+                                ORDER BY day, minute""",
+                             (user_id, datetime.now().date().isoformat()), label='my_bookings')
+    if not rows:
+        return "📋 Активных записей нет.\n\n📝 Записаться: /book"
+    
+    lines = ["📋 <b>Ваши записи:</b>\n"]
+    for appointment_id, service, date_str, time_str in rows:
+        lines.append(f"#{appointment_id} · {date_str} {time_str}\n{service}\n")
+    lines.append("Отмена: /cancel_booking ID")
+    return "\n".join(lines)
+
+async def my_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(await my_bookings_text(update.effective_user.id), parse_mode='HTML')
+
+async def my_bookings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.edit_message_text(await my_bookings_text(update.effective_user.id),
+                                                  parse_mode='HTML')
+
+# Команды мастера: салон мастера определяется по его chat_id
+# (tenants.master_chat_id, задается оператором)
+def master_tenant(update: Update):
+    return tenant_registry.for_master(update.effective_user.id)
+
+def service_name(config, service_key):
+    service = config.services.get(service_key)
+    return service['name'] if service else service_key
+
+def stats_lines(config, title, summary):
+    lines = [
+        f"<b>{title}</b>",
+        f"📋 Записей: {summary['bookings']} · ❌ Отмен: {summary['cancellations']}",
+        f"💰 Выручка: {summary['revenue']}₽",
+    ]
+    for service_key, bookings, revenue in summary['services']:
+        lines.append(f"   {service_name(config, service_key)}: {bookings} · {revenue}₽")
+    return lines
+
+# /master — сводка за сегодня, неделю и месяц из daily_stats
+async def master_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    config = master_tenant(update)
+    if config is None:
+        await update.message.reply_text("⛔ Команда доступна только мастеру")
+        return
+    
+    summary = await db.run(stats.dashboard, config.id, label='master_dashboard')
+    lines = [f"📊 <b>Панель мастера · {config.name}</b>\n"]
+    lines += stats_lines(config, "Сегодня", summary['today']) + [""]
+    lines += stats_lines(config, "Эта неделя", summary['week']) + [""]
+    lines += stats_lines(config, "Этот месяц", summary['month'])
+    lines.append("\n📅 Записи на сегодня: /master_today\n🔍 Поиск клиента: /find имя или телефон"
+                 "\n🔄 Пересчитать сводку: /master_rebuild")
+    if is_owner(update.effective_user.id):
+        lines.append("📤 Выгрузка: /export")
+    await update.message.reply_text("\n".join(lines), parse_mode='HTML')
+
+# /master_today — список записей на сегодня
+async def master_today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    config = master_tenant(update)
+    if config is None:
+        await update.message.reply_text("⛔ Команда доступна только мастеру")
+        return
+    
+    today = datetime.now().date()
+    rows = await db.fetchall("""SELECT id, time, service, name, phone FROM appointments
+                                WHERE tenant_id = ? AND day = ? AND status = 'active' ORDER BY minute""",
+                             (config.id, today.isoformat()), label='master_today')
+    summary = await db.run(stats.dashboard, config.id, label='master_dashboard')
+    
+    lines = [f"📅 <b>Записи на {today.strftime('%d.%m.%Y')}:</b>\n"]
+    for appointment_id, time_str, service, client_name, client_phone in rows:
+        lines.append(f"🕒 {time_str} · #{appointment_id}\n{service}\n👤 {client_name} {client_phone}\n")
+    if not rows:
+        lines.append("Записей нет\n")
+    lines.append(f"Всего: {summary['today']['bookings']}, сумма: {summary['today']['revenue']}₽")
+    await update.message.reply_text("\n".join(lines), parse_mode='HTML')
+
+# /master_rebuild — сверка сводки с сырыми таблицами
+async def master_rebuild_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if master_tenant(update) is None:
+        await update.message.reply_text("⛔ Команда доступна только мастеру")
+        return
     
-    # Создание приложения
-    application = Application.builder().token(BOT_TOKEN).build()
+    mismatched = await db.transaction(stats.rebuild, label='stats_rebuild')
+    await update.message.reply_text(f"🔄 Сводка пересчитана. Расхождений по дням: {mismatched}")
+
+# /find текст — поиск клиентов и записей по имени, телефону и заметкам
+async def find_page_text(update, config, text, offset=0):
+    rows, has_more = await db.run(search_find, text, config.id, offset, FIND_PAGE_SIZE,
+                                  is_owner(update.effective_user.id), label='find')
+    if not rows:
+        return f"🔍 По запросу «{text}» ничего не найдено", None
+    
+    lines = [f"🔍 <b>Поиск: {text}</b>\n"]
+    for kind, item_id, client_name, client_phone, date_str, time_str, detail, status in rows:
+        if kind == 'client':
+            lines.append(f"👤 <b>{client_name}</b> {clients.format_phone(client_phone) if client_phone else ''}\n"
+                         f"   визитов: {detail}, последний: {date_str or '—'}\n")
+        else:
+            mark = '' if status == 'active' else f" ({status})"
+            lines.append(f"📅 {date_str} {time_str} · #{item_id}{mark}\n"
+                         f"   {detail}\n   👤 {client_name} {client_phone}\n")
+    
+    buttons = []
+    if offset:
+        buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"find_{max(0, offset - FIND_PAGE_SIZE)}"))
+    if has_more:
+        buttons.append(InlineKeyboardButton("Еще ▶️", callback_data=f"find_{offset + FIND_PAGE_SIZE}"))
+    return "\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    config = master_tenant(update)
+    if config is None:
+        await update.message.reply_text("⛔ Команда доступна только мастеру")
+        return
+    
+    text = ' '.join(context.args).strip()
+    if not text:
+        await update.message.reply_text("Использование: /find имя, телефон или слово из заметки")
+        return
+    # Текст запроса не помещается в callback_data — страницы берут его отсюда
+    context.user_data['find_query'] = text
+    page_text, reply_markup = await find_page_text(update, config, text)
+    await update.message.reply_text(page_text, reply_markup=reply_markup, parse_mode='HTML')
+
+async def find_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    config = master_tenant(update)
+    text = context.user_data.get('find_query')
+    if config is None or not text:
+        return
+    page_text, reply_markup = await find_page_text(update, config, text, int(query.data.replace('find_', '')))
+    await query.edit_message_text(page_text, reply_markup=reply_markup, parse_mode='HTML')
+
+# /export [csv|jsonl] [с dd.mm.yyyy] [по dd.mm.yyyy] — выгрузка таблиц документами.
+# Выгружается вся база (клиенты и отзывы общие), поэтому команда только у
+# владельца развертывания (OWNER_CHAT_ID).
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_owner(update.effective_user.id):
+        await update.message.reply_text("⛔ Команда доступна только владельцу")
+        return
+    
+    # «с»/«по» относятся к следующей дате; даты без них — начало, затем конец
+    usage = "Использование: /export [csv|jsonl] [с ДД.ММ.ГГГГ] [по ДД.ММ.ГГГГ]"
+    fmt = 'csv'
+    bounds = {}
+    marker = None
+    for arg in context.args:
+        word = arg.lower()
+        if marker is None and word in EXPORT_FORMATS:
+            fmt = word
+            continue
+        if marker is None and word in ('с', 'по'):
+            marker = word
+            continue
+        try:
+            day = datetime.strptime(arg, '%d.%m.%Y').date()
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+        key = marker or ('по' if 'с' in bounds else 'с')
+        if key in bounds:
+            await update.message.reply_text(usage)
+            return
+        bounds[key] = day
+        marker = None
+    first, last = bounds.get('с'), bounds.get('по')
+    if marker is not None or (first and last and first > last):
+        await update.message.reply_text(usage)
+        return
+    
+    await update.message.reply_text("⏳ Готовлю выгрузку...")
+    suffix = (f"_from_{first.isoformat()}" if first else '') + (f"_to_{last.isoformat()}" if last else '')
+    for table in EXPORT_TABLES:
+        spool, count = await db.run(export_table, table, fmt, first, last, label=f'export_{table}')
+        # У SpooledTemporaryFile в памяти нет имени, и PTB на нем падает;
+        # сам PTB читает документ целиком, так что отдаем ему байты
+        with spool:
+            await update.message.reply_document(
+                document=spool.read(), filename=f"{table}{suffix}.{fmt}.gz",
+                caption=f"{table}: {count} строк")
+
+# Обработчик ошибок
+async def error(update: object, context: ContextTypes.DEFAULT_TYPE):
+    logger.error("Ошибка при обработке обновления", exc_info=context.error)
+
+# Прогрев кэшей в фоне: настройки салонов, индексы занятости, окно
+# напоминаний. Пока он идет, обработчики читают нужное из базы сами
+# (tenant_registry.ensure, availability.ensure).
+async def warm_up(application: Application):
+    try:
+        await tenant_registry.ensure(db)
+        tenant_registry.start(application)
+        await availability.warm(db)
+        if workers.is_primary():
+            # Напоминания клиентам о предстоящих визитах
+            await reminders.start(application, db)
+        startup_timer.mark('warm')
+    except Exception:
+        logger.exception("Ошибка прогрева кэшей, обработчики продолжат читать из базы")
+
+async def on_startup(application: Application):
+    # Метрики: время SQL, сводка в лог, /metrics в режиме polling
+    if METRICS_ENABLED:
+        db.observer = observe_query
+        summary_logger.start()
+        if BOT_MODE != 'webhook' and METRICS_PORT:
+            start_metrics_server('0.0.0.0', METRICS_PORT)
+    
+    # Обновления принимаются сразу, кэши догреваются в фоне
+    application.bot_data['warm_up'] = asyncio.create_task(warm_up(application))
+    
+    # Несколько процессов: кэши сверяются с общей базой
+    workers.sync.start(application, db)
+    
+    # Фоновые задачи — в одном процессе (единственном или первом)
+    if workers.is_primary():
+        # Фоновая отправка уведомлений из outbox
+        outbox_dispatcher.start(application.bot, db, tenant_registry.master_chat_id)
+        
+        # Архивация прошедших записей и обслуживание базы в тихий час
+        maintenance.start(application, db)
+    startup_timer.mark('accepting_updates')
+
+async def on_shutdown(application: Application):
+    warm_task = application.bot_data.get('warm_up')
+    if warm_task is not None and not warm_task.done():
+        warm_task.cancel()
+    await outbox_dispatcher.stop()
+    await summary_logger.stop()
+    
+    # Сводка по времени запросов и закрытие пула соединений
+    for label, timing in db.timings().items():
+        logger.info(f"SQL [{label}]: {timing['count']} раз, среднее {timing['avg'] * 1000:.2f} мс, "
+                    f"максимум {timing['max'] * 1000:.2f} мс")
+    db.close()
+
+def build_application(builder=None, request=None):
+    # Создание приложения. Обновления разных чатов обрабатываются
+    # параллельно, одного чата — по порядку
+    builder = builder or Application.builder().token(BOT_TOKEN)
+    application = (
+        builder
+        .request(instrument_request(request or HTTPXRequest(connection_pool_size=256)))
+        .concurrent_updates(ChatOrderedUpdateProcessor(CONCURRENT_UPDATES, guard=flood_guard))
+        .persistence(SQLitePersistence(db))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     
     # Обработчик диалога записи через ConversationHandler - ИСПРАВЛЕННАЯ ВЕРСИЯ
     conv_handler = ConversationHandler(
@@ -503,11 +796,10 @@ def main():
             ],
             DATE: [
                 CallbackQueryHandler(date_handler, pattern='^date_'),
-                CallbackQueryHandler(quick_book_handler, pattern='^back_to_services$')
+                CallbackQueryHandler(quick_book_handler, pattern='^(back_to_services|quick_book)$')
             ],
             TIME: [
-                CallbackQueryHandler(time_handler, pattern='^time_'),
-                CallbackQueryHandler(date_handler, pattern='^back_to_dates$')
+                CallbackQueryHandler(time_handler, pattern='^(time_|back_to_dates$)')
             ],
             NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, name)],
             PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, phone)],
@@ -518,32 +810,87 @@ def main():
             CallbackQueryHandler(cancel, pattern='^cancel_booking$'),
             CallbackQueryHandler(cancel, pattern='^confirm_no$')
         ],
-        per_message=False
+        per_message=False,
+        name='booking',
+        persistent=True
     )
     
     # Регистрация обработчиков команд
+    application.add_handler(TypeHandler(Update, before_update), group=-1)
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("salons", salons))
     application.add_handler(CommandHandler("services", show_services))
     application.add_handler(CommandHandler("contacts", show_contacts))
     application.add_handler(CommandHandler("reviews", show_reviews))
     application.add_handler(CommandHandler("my_bookings", my_bookings))
     application.add_handler(CommandHandler("master", master_command))
-    application.add_handler(CommandHandler("master_today", master_command))
+    application.add_handler(CommandHandler("master_today", master_today_command))
+    application.add_handler(CommandHandler("master_rebuild", master_rebuild_command))
+    application.add_handler(CommandHandler("find", find_command))
+    application.add_handler(CommandHandler("export", export_command))
     application.add_handler(CommandHandler("cancel_booking", cancel_booking))
     
     # Обработчики callback queries для главного меню
     application.add_handler(CallbackQueryHandler(handle_main_menu_callbacks, pattern='^(show_services|show_contacts|leave_review|my_bookings_list|leave_review_after_booking)$'))
+    application.add_handler(CallbackQueryHandler(salon_callback, pattern=r'^salon_\d+$'))
+    
+    application.add_handler(CallbackQueryHandler(reviews_page_callback, pattern=r'^reviews_(newer|older)_\d+$'))
+    application.add_handler(CallbackQueryHandler(find_callback, pattern=r'^find_\d+$'))
     
-    # Обработчик отзывов
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_review))
+    # Текст отзыва — только от пользователей, которые ждут отзыва; раньше
+    # диалога записи, чтобы отзыв не приняли за имя или телефон
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & review_pending, handle_review))
     
     # ConversationHandler должен быть добавлен последним
     application.add_handler(conv_handler)
     application.add_error_handler(error)
     
+    # Время работы каждого обработчика (METRICS=0 отключает)
+    instrument_application(application)
+    return application
+
+def main():
+    # Инициализация базы данных
+    init_db()
+    
+    if BOT_MODE == 'webhook' and workers.WORKERS > 1:
+        # Фронтовой процесс принимает вебхук и раздает обновления
+        # процессам-воркерам по chat_id
+        logger.info(f"Бот запущен в режиме webhook, воркеров: {workers.WORKERS}")
+        workers.run_router(BOT_TOKEN, serve_worker, listen='0.0.0.0', port=PORT, url_path=WEBHOOK_PATH,
+                           webhook_url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+        return
+    
+    application = build_application()
+    
     # Запуск бота
-    logger.info("Бот запущен и готов к работе!")
-    application.run_polling()
+    logger.info(f"Бот запущен и готов к работе! Режим: {BOT_MODE}")
+    if BOT_MODE == 'webhook':
+        asyncio.run(serve(
+            application,
+            listen='0.0.0.0',
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+        ))
+    else:
+        if workers.WORKERS > 1:
+            logger.warning("WORKERS > 1 поддерживается только в режиме webhook, запускаю один процесс")
+        application.run_polling()
+
+def serve_worker(index):
+    # Процесс-воркер: слушает только localhost, вебхук ставит фронтовой процесс
+    workers.set_worker(index)
+    application = build_application()
+    logger.info(f"Воркер {index} запущен")
+    asyncio.run(serve(
+        application,
+        listen='127.0.0.1',
+        port=workers.worker_port(index),
+        url_path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+    ))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,67 @@
+import re
+from collections import OrderedDict
+
+# Клиент определяется по Telegram user_id; телефон хранится в E.164 как
+# целое число (79123456789), текстовое '+7...' остается для показа.
+
+CLIENT_CACHE_SIZE = 1024
+
+_PHONE_RE = re.compile(r'^(\+7|8|7)?(\d{10})$')
+
+
+def normalize_phone(text):
+    # '+7 (912) 345-67-89', '89123456789', '9123456789' -> 79123456789;
+    # None, если это не российский номер
+    cleaned = re.sub(r'[\s\-()]', '', text or '')
+    match = _PHONE_RE.match(cleaned)
+    if not match:
+        return None
+    return int('7' + match.group(2))
+
+
+def format_phone(e164):
+    return f"+{e164}"
+
+
+class ClientCache:
+    # LRU user_id -> (name, phone) или None для неизвестных.
+    # Используется только из цикла событий, поэтому без блокировок.
+
+    def __init__(self, size=CLIENT_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        # (найден ли ключ, значение)
+        if user_id not in self._entries:
+            return False, None
+        self._entries.move_to_end(user_id)
+        return True, self._entries[user_id]
+
+    def put(self, user_id, client):
+        self._entries[user_id] = client
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+cache = ClientCache()
+
+
+def find_client(conn, user_id):
+    row = conn.execute("SELECT name, phone_e164 FROM clients WHERE user_id = ?", (user_id,)).fetchone()
+    if row is None or row[1] is None:
+        return None
+    return row[0], format_phone(row[1])
+
+
+async def lookup(db, user_id):
+    # Клиент по user_id: сначала LRU, затем один запрос по индексу
+    found, client = cache.get(user_id)
+    if not found:
+        client = await db.run(find_client, user_id, label='find_client')
+        cache.put(user_id, client)
+    return client
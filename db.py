@@ -0,0 +1,177 @@
+import os
+import time
+import queue
+import asyncio
+import contextvars
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get('DB_PATH', 'appointments.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+
+# Запросы дольше этого порога (в секундах) пишутся в лог
+SLOW_QUERY_SECONDS = float(os.environ.get('DB_SLOW_QUERY_SECONDS', '0.05'))
+
+# Счетчик запросов текущей задачи: если в контексте задан Counter, каждый
+# запрос увеличивает его по label (нагрузочные тесты считают SQL на шаг)
+query_counter = contextvars.ContextVar('query_counter', default=None)
+
+
+class QueryStats:
+    # Накопленная статистика по одному типу запроса
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def as_dict(self):
+        avg = self.total / self.count if self.count else 0.0
+        return {'count': self.count, 'total': self.total, 'avg': avg, 'max': self.max}
+
+
+class Database:
+    # Пул долгоживущих соединений SQLite. Запросы выполняются в отдельных
+    # потоках, чтобы не блокировать цикл событий бота.
+
+    def __init__(self, path=DB_PATH, pool_size=DB_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = None
+        self._executor = None
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        # SQLite допускает одного писателя; без общей блокировки соединения
+        # пула ждут друг друга в busy handler, который спит до 100 мс
+        self._write_lock = threading.Lock()
+        # Необязательный наблюдатель observer(label, elapsed) — метрики
+        self.observer = None
+
+    def _connect(self):
+        # isolation_level=None: транзакциями управляем сами (BEGIN/COMMIT),
+        # cached_statements: подготовленные запросы живут вместе с соединением
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               isolation_level=None, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def open(self):
+        if self._pool is not None:
+            return
+        self._pool = queue.Queue()
+        for _ in range(self.pool_size):
+            self._pool.put(self._connect())
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='db')
+        logger.info(f"База данных открыта: {self.path}, соединений: {self.pool_size}")
+
+    def close(self):
+        if self._pool is None:
+            return
+        self._executor.shutdown(wait=True)
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._pool = None
+        self._executor = None
+
+    @contextmanager
+    def connection(self):
+        # Синхронный доступ к соединению из пула (инициализация, фоновые задачи)
+        if self._pool is None:
+            self.open()
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _record(self, label, elapsed):
+        with self._stats_lock:
+            stats = self._stats.get(label)
+            if stats is None:
+                stats = self._stats[label] = QueryStats()
+            stats.add(elapsed)
+        if self.observer is not None:
+            self.observer(label, elapsed)
+        if elapsed >= SLOW_QUERY_SECONDS:
+            logger.warning(f"Медленный запрос [{label}]: {elapsed * 1000:.1f} мс")
+
+    def _run_sync(self, label, fn, args):
+        with self.connection() as conn:
+            started = time.perf_counter()
+            try:
+                return fn(conn, *args)
+            finally:
+                self._record(label, time.perf_counter() - started)
+
+    async def run(self, fn, *args, label=None):
+        # Выполняет fn(conn, *args) в потоке пула и возвращает результат
+        if self._pool is None:
+            self.open()
+        label = label or fn.__name__
+        counter = query_counter.get()
+        if counter is not None:
+            counter[label] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run_sync, label, fn, args)
+
+    async def fetchone(self, sql, params=(), label=None):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone(), label=label or sql)
+
+    async def fetchall(self, sql, params=(), label=None):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall(), label=label or sql)
+
+    async def execute(self, sql, params=(), label=None):
+        # Одиночный запрос на запись; возвращает lastrowid
+        def write(conn):
+            with self._write_lock:
+                return conn.execute(sql, params).lastrowid
+        return await self.run(write, label=label or sql)
+
+    async def transaction(self, fn, *args, label=None):
+        # Выполняет fn(conn, *args) внутри одной транзакции BEGIN IMMEDIATE
+        def wrapped(conn, *inner):
+            with self._write_lock:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = fn(conn, *inner)
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+                return result
+        return await self.run(wrapped, *args, label=label or fn.__name__)
+
+    async def locked(self, fn, *args, label=None):
+        # fn(conn, *args) под блокировкой записи, но вне транзакции —
+        # для PRAGMA, которые нельзя выполнять внутри BEGIN
+        def wrapped(conn, *inner):
+            with self._write_lock:
+                return fn(conn, *inner)
+        return await self.run(wrapped, *args, label=label or fn.__name__)
+
+    def timings(self):
+        # Снимок статистики: {label: {count, total, avg, max}}
+        with self._stats_lock:
+            return {label: stats.as_dict() for label, stats in self._stats.items()}
+
+    def reset_timings(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+
+db = Database()
@@ -0,0 +1,92 @@
+import io
+import csv
+import gzip
+import json
+import tempfile
+from datetime import date, timedelta
+
+# Выгрузка таблиц для мастера. Строки читаются курсором пачками по
+# EXPORT_CHUNK_SIZE и сразу сжимаются в SpooledTemporaryFile: небольшая
+# выгрузка остается в памяти, большая уходит на диск. Несжатые строки
+# таблицы целиком в памяти не бывают; в память при отправке попадает только
+# сжатый файл.
+
+EXPORT_CHUNK_SIZE = 1000
+# Сколько сжатых байт держать в памяти до сброса во временный файл
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+FORMATS = ('csv', 'jsonl')
+
+# Таблица -> условие диапазона дат по индексированному столбцу.
+# У записей и архива это день визита (индексы по day), у клиентов и
+# отзывов — created_at в формате 'YYYY-MM-DD HH:MM:SS', поэтому граница
+# задается полуинтервалом строк, а не date(created_at).
+TABLES = {
+    'appointments': "day >= ? AND day < ?",
+    'appointments_archive': "day >= ? AND day < ?",
+    'clients': "created_at >= ? AND created_at < ?",
+    'reviews': "created_at >= ? AND created_at < ?",
+}
+
+
+def export_query(table, first=None, last=None):
+    # first/last — объекты date, включительно; любой из них может быть None
+    sql = f"SELECT * FROM {table}"
+    if first is None and last is None:
+        return sql + " ORDER BY rowid", ()
+    first = (first or date.min).isoformat()
+    last = (last + timedelta(days=1)).isoformat() if last else '9999-12-31'
+    return f"{sql} WHERE {TABLES[table]}", (first, last)
+
+
+def _write_csv(out, columns, rows):
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for chunk in rows:
+        writer.writerows(chunk)
+    # Закрытие обертки закрыло бы и gzip-поток
+    text.detach()
+
+
+def _write_jsonl(out, columns, rows):
+    for chunk in rows:
+        out.write(''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                          for row in chunk).encode('utf-8'))
+
+
+def export_table(conn, table, fmt='csv', first=None, last=None):
+    # Возвращает (файл, число строк); файл открыт и перемотан в начало,
+    # закрыть его должен вызывающий
+    if table not in TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+    sql, params = export_query(table, first, last)
+    cursor = conn.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    count = 0
+
+    def chunks():
+        nonlocal count
+        while True:
+            chunk = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                return
+            count += len(chunk)
+            yield chunk
+
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=6) as out:
+            if fmt == 'csv':
+                _write_csv(out, columns, chunks())
+            else:
+                _write_jsonl(out, columns, chunks())
+    except BaseException:
+        spool.close()
+        raise
+    finally:
+        cursor.close()
+    spool.seek(0)
+    return spool, count
@@ -0,0 +1,90 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.error import TelegramError
+
+from ratelimit import TokenBucket
+from metrics import METRICS_ENABLED, registry
+
+logger = logging.getLogger(__name__)
+
+# Лимит на пользователя: FLOOD_RATE обновлений в секунду, всплеск до FLOOD_BURST
+FLOOD_RATE = float(os.environ.get('FLOOD_RATE', '1'))
+FLOOD_BURST = float(os.environ.get('FLOOD_BURST', '5'))
+# Сколько секунд повторное нажатие той же кнопки считается дублем
+DEDUPE_TTL = float(os.environ.get('DEDUPE_TTL', '3'))
+
+MAX_TRACKED_USERS = 10000
+MAX_DEDUPE_ENTRIES = 10000
+
+registry.describe('bot_flood_rejected_total', 'Обновления, отброшенные до обработчиков')
+
+
+class FloodGuard:
+    # Фильтр перед Application.process_update: спам и двойные нажатия
+    # отбрасываются до обработчиков, persistence и SQL. Вызывается из
+    # ChatOrderedUpdateProcessor в цикле событий, поэтому без блокировок.
+
+    def __init__(self, rate=FLOOD_RATE, burst=FLOOD_BURST, dedupe_ttl=DEDUPE_TTL):
+        self.rate = rate
+        self.burst = burst
+        self.dedupe_ttl = dedupe_ttl
+        # user_id -> TokenBucket, LRU: молчащие пользователи вытесняются
+        self._buckets = OrderedDict()
+        # (chat_id, message_id, callback_data) -> момент истечения; порядок
+        # вставки совпадает с порядком истечения, так как TTL общий
+        self._recent = OrderedDict()
+
+    def check(self, update):
+        # None — пропустить, иначе причина отказа
+        if not isinstance(update, Update) or update.effective_user is None:
+            return None
+        now = time.monotonic()
+        query = update.callback_query
+        if query is not None and query.message is not None:
+            self._expire(now)
+            key = (query.message.chat.id, query.message.message_id, query.data)
+            if key in self._recent:
+                return 'duplicate'
+            self._recent[key] = now + self.dedupe_ttl
+            if len(self._recent) > MAX_DEDUPE_ENTRIES:
+                self._recent.popitem(last=False)
+        if not self._bucket(update.effective_user.id).try_acquire():
+            return 'rate_limit'
+        return None
+
+    def _bucket(self, user_id):
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > MAX_TRACKED_USERS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def _expire(self, now):
+        while self._recent:
+            key, expires = next(iter(self._recent.items()))
+            if expires > now:
+                break
+            del self._recent[key]
+
+    async def reject(self, update, reason):
+        if METRICS_ENABLED:
+            registry.inc('bot_flood_rejected_total', (('reason', reason),))
+        # Кнопке нужен ответ, иначе у клиента крутятся часики; сообщения
+        # отбрасываются молча
+        query = update.callback_query
+        if query is None:
+            return
+        try:
+            await query.answer("⏳ Слишком часто, подождите немного" if reason == 'rate_limit' else None)
+        except TelegramError as e:
+            logger.debug(f"Не удалось ответить на отброшенный callback: {e}")
+
+
+flood_guard = FloodGuard()
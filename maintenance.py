@@ -0,0 +1,86 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import date, timedelta, time as day_time
+
+from scheduling import SALON_TZ
+
+logger = logging.getLogger(__name__)
+
+# Записи, визит по которым был раньше стольких дней назад, уходят в архив
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '120'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+# Пауза между пачками: живые записи успевают взять блокировку записи
+ARCHIVE_BATCH_PAUSE = 0.05
+# Тихий час, когда запускается обслуживание, в часовом поясе салона
+# (SALON_TZ): без tzinfo JobQueue считал бы время по UTC
+MAINTENANCE_HOUR = int(os.environ.get('MAINTENANCE_HOUR', '4'))
+# Сколько свободных страниц возвращать за один incremental_vacuum
+VACUUM_PAGES = 2000
+
+
+def archive_batch(conn, cutoff, limit):
+    # Одна пачка внутри db.transaction: копия в архив и удаление из
+    # горячей таблицы. Статус не меняется — сводка daily_stats и
+    # stats.rebuild считают архив вместе с appointments.
+    ids = [row[0] for row in conn.execute("SELECT id FROM appointments WHERE day < ? ORDER BY day LIMIT ?",
+                                          (cutoff, limit))]
+    if not ids:
+        return 0
+    placeholders = ','.join('?' * len(ids))
+    conn.execute(f"INSERT INTO appointments_archive SELECT * FROM appointments WHERE id IN ({placeholders})", ids)
+    conn.execute(f"DELETE FROM appointments WHERE id IN ({placeholders})", ids)
+    return len(ids)
+
+
+def optimize(conn):
+    # Вне транзакции: incremental_vacuum и checkpoint внутри BEGIN не работают
+    conn.execute("PRAGMA optimize")
+    conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+    return conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+
+
+class Maintenance:
+    # Ежедневное обслуживание базы в тихий час: архивация прошедших
+    # записей пачками, PRAGMA optimize, incremental vacuum и checkpoint WAL
+
+    def __init__(self):
+        self.db = None
+        self._running = False
+
+    def start(self, application, db):
+        self.db = db
+        application.job_queue.run_daily(self._job, time=day_time(hour=MAINTENANCE_HOUR, tzinfo=SALON_TZ),
+                                        name='maintenance')
+
+    async def _job(self, context):
+        await self.run()
+
+    async def run(self):
+        if self._running:
+            return None
+        self._running = True
+        started = time.perf_counter()
+        try:
+            archived = await self.archive()
+            busy, wal_pages, checkpointed = await self.db.locked(optimize, label='maintenance_optimize')
+            logger.info(f"Обслуживание: в архив {archived} записей, WAL {checkpointed}/{wal_pages} страниц"
+                        f"{' (занято читателями)' if busy else ''}, "
+                        f"{(time.perf_counter() - started) * 1000:.0f} мс")
+            return archived
+        finally:
+            self._running = False
+
+    async def archive(self):
+        cutoff = (date.today() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+        total = 0
+        while True:
+            moved = await self.db.transaction(archive_batch, cutoff, ARCHIVE_BATCH_SIZE, label='archive_batch')
+            total += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                return total
+            await asyncio.sleep(ARCHIVE_BATCH_PAUSE)
+
+
+maintenance = Maintenance()
@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import functools
+from bisect import bisect_left
+
+from telegram.ext import ConversationHandler
+from telegram.request import BaseRequest
+from tornado.web import RequestHandler
+
+logger = logging.getLogger(__name__)
+
+# METRICS=0 полностью отключает сбор: обработчики и запросы не оборачиваются
+METRICS_ENABLED = os.environ.get('METRICS', '1') != '0'
+METRICS_LOG_INTERVAL = int(os.environ.get('METRICS_LOG_INTERVAL', '300'))
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Оценка по границам корзин — для логов этого достаточно
+        target = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target and count:
+                return BUCKETS[i] if i < len(BUCKETS) else float('inf')
+        return 0.0
+
+
+class Registry:
+    # Гистограммы, счетчики и значения с метками; метки — кортеж пар (имя, значение)
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._gauges[(name, labels)] = value
+
+    def render(self):
+        # Текстовый формат Prometheus
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            header(name, 'gauge')
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # Сводка для периодического структурированного лога
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items()) + list(self._gauges.items())
+        result = {}
+        for (name, labels), histogram in histograms:
+            key = ','.join(f"{k}={v}" for k, v in labels)
+            result.setdefault(name, {})[key] = {
+                'count': histogram.count,
+                'avg_ms': round(histogram.sum / histogram.count * 1000, 2) if histogram.count else 0,
+                'p50_ms': histogram.quantile(0.5) * 1000,
+                'p95_ms': histogram.quantile(0.95) * 1000,
+            }
+        for (name, labels), value in counters:
+            key = ','.join(f"{k}={v}" for k, v in labels)
+            result.setdefault(name, {})[key] = value
+        return result
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (f'{key}="{_escape(value)}"' for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value):
+    return ' '.join(str(value).split()).replace('\\', '\\\\').replace('"', '\\"')
+
+
+registry = Registry()
+registry.describe('bot_handler_seconds', 'Время работы обработчика обновлений')
+registry.describe('bot_handler_errors_total', 'Исключения в обработчиках')
+registry.describe('bot_callback_errors_total', 'Ошибки, перехваченные в handle_main_menu_callbacks')
+registry.describe('bot_db_query_seconds', 'Время выполнения SQL-запроса')
+registry.describe('bot_telegram_api_seconds', 'Длительность вызова Bot API')
+registry.describe('bot_startup_seconds', 'Время от запуска процесса до фазы запуска')
+
+
+def instrument(callback, name=None):
+    if not METRICS_ENABLED:
+        return callback
+    labels = (('handler', name or callback.__name__),)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            registry.inc('bot_handler_errors_total', labels)
+            raise
+        finally:
+            registry.observe('bot_handler_seconds', labels, time.perf_counter() - started)
+
+    return wrapper
+
+
+def _handlers_of(handler):
+    if isinstance(handler, ConversationHandler):
+        yield from handler.entry_points
+        for state_handlers in handler.states.values():
+            yield from state_handlers
+        yield from handler.fallbacks
+    else:
+        yield handler
+
+
+def instrument_application(application):
+    # Оборачивает колбэки всех зарегистрированных обработчиков, включая
+    # вложенные в ConversationHandler
+    if not METRICS_ENABLED:
+        return
+    seen = set()
+    for handlers in application.handlers.values():
+        for top in handlers:
+            for handler in _handlers_of(top):
+                if id(handler) not in seen:
+                    seen.add(id(handler))
+                    handler.callback = instrument(handler.callback)
+
+
+def observe_query(label, elapsed):
+    registry.observe('bot_db_query_seconds', (('query', label),), elapsed)
+
+
+def count_callback_error(data):
+    if METRICS_ENABLED:
+        registry.inc('bot_callback_errors_total', (('callback', data),))
+
+
+class InstrumentedRequest(BaseRequest):
+    # Обертка над сетевым слоем Bot API: время каждого вызова по методу
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        labels = (('method', url.rsplit('/', 1)[-1]),)
+        started = time.perf_counter()
+        try:
+            return await self.inner.do_request(url, method, request_data, read_timeout,
+                                               write_timeout, connect_timeout, pool_timeout)
+        finally:
+            registry.observe('bot_telegram_api_seconds', labels, time.perf_counter() - started)
+
+
+def instrument_request(request):
+    return InstrumentedRequest(request) if METRICS_ENABLED else request
+
+
+class MetricsHandler(RequestHandler):
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(registry.render())
+
+
+class SummaryLogger:
+    # Раз в METRICS_LOG_INTERVAL секунд пишет сводку одной JSON-строкой
+
+    def __init__(self):
+        self._task = None
+
+    def start(self):
+        if METRICS_ENABLED and METRICS_LOG_INTERVAL > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.log()
+
+    def log(self):
+        if METRICS_ENABLED:
+            logger.info("metrics " + json.dumps(registry.summary(), ensure_ascii=False))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(METRICS_LOG_INTERVAL)
+            self.log()
+
+
+summary_logger = SummaryLogger()
+
+
+def process_age():
+    # Сколько секунд назад запущен процесс, включая старт интерпретатора и
+    # импорты; вне Linux — None
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rpartition(')')[2].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    # Фазы запуска в секундах от старта процесса: схема проверена, бот
+    # принимает обновления, первое обновление, кэши прогреты. Перезапуск
+    # после падения должен доходить до first_update меньше чем за секунду.
+
+    def __init__(self):
+        age = process_age()
+        self.started = time.monotonic() - (age or 0.0)
+        self.phases = {}
+
+    def mark(self, phase):
+        if phase in self.phases:
+            return
+        elapsed = time.monotonic() - self.started
+        self.phases[phase] = elapsed
+        if METRICS_ENABLED:
+            registry.set('bot_startup_seconds', (('phase', phase),), round(elapsed, 4))
+        logger.info(f"Запуск: {phase} через {elapsed * 1000:.0f} мс")
+
+
+startup_timer = StartupTimer()
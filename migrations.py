@@ -0,0 +1,456 @@
+import time
+import logging
+import sqlite3
+from itertools import groupby
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+
+# Дата 'ДД.ММ.ГГГГ' -> 'ГГГГ-ММ-ДД' и время 'ЧЧ:ММ' -> минуты от начала суток
+SQL_ISO_DAY = "substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-' || substr(date, 1, 2)"
+SQL_MINUTE = "CAST(substr(time, 1, 2) AS INTEGER) * 60 + CAST(substr(time, 4, 2) AS INTEGER)"
+# Телефон без '+', пробелов, скобок и дефисов
+SQL_PHONE_DIGITS = ("replace(replace(replace(replace(replace(phone, '+', ''), ' ', ''), '-', ''), "
+                    "'(', ''), ')', '')")
+
+
+def _initial_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS appointments
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  service TEXT,
+                  service_key TEXT,
+                  price INTEGER,
+                  duration INTEGER,
+                  date TEXT,
+                  time TEXT,
+                  name TEXT,
+                  phone TEXT,
+                  status TEXT DEFAULT 'active',
+                  notes TEXT,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS clients
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  phone TEXT UNIQUE,
+                  name TEXT,
+                  visits_count INTEGER DEFAULT 0,
+                  last_visit TEXT,
+                  total_spent INTEGER DEFAULT 0,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS reviews
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  client_name TEXT,
+                  phone TEXT,
+                  rating INTEGER,
+                  text TEXT,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+    # Одно активное бронирование на дату и время
+    try:
+        conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_active_slot
+                     ON appointments(date, time) WHERE status = 'active' ''')
+    except sqlite3.IntegrityError:
+        logger.warning("В базе есть дубли активных записей, уникальный индекс не создан")
+
+
+def _sortable_columns(conn):
+    # day — ISO-дата 'ГГГГ-ММ-ДД', minute — минуты от начала суток
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(appointments)")}
+    if 'day' not in columns:
+        conn.execute("ALTER TABLE appointments ADD COLUMN day TEXT")
+    if 'minute' not in columns:
+        conn.execute("ALTER TABLE appointments ADD COLUMN minute INTEGER")
+
+
+def _backfill_sortable_columns(conn):
+    # Заполняем day/minute пачками, каждая пачка — отдельная короткая
+    # транзакция, чтобы не держать блокировку записи на всю таблицу
+    total = 0
+    last_id = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        batch_end, count = conn.execute('''SELECT MAX(id), COUNT(*) FROM
+                                        (SELECT id FROM appointments WHERE day IS NULL AND id > ?
+                                         ORDER BY id LIMIT ?)''',
+                                        (last_id, BACKFILL_BATCH_SIZE)).fetchone()
+        if not count:
+            conn.execute("COMMIT")
+            break
+        conn.execute(f'''UPDATE appointments SET day = {SQL_ISO_DAY}, minute = {SQL_MINUTE}
+                     WHERE day IS NULL AND id > ? AND id <= ?''', (last_id, batch_end))
+        conn.execute("COMMIT")
+        total += count
+        last_id = batch_end
+    if total:
+        logger.info(f"Миграция: заполнено day/minute для {total} записей")
+
+
+def _indexes(conn):
+    # Покрывающий индекс для выборок занятости и диапазонов дат
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_appointments_day_status
+                 ON appointments(day, status, minute, duration)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_phone ON appointments(phone)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_created_at ON appointments(created_at)")
+
+
+def _outbox(conn):
+    # Исходящие уведомления пишутся в той же транзакции, что и запись.
+    # chat_id IS NULL — сообщение для мастера.
+    conn.execute('''CREATE TABLE IF NOT EXISTS outbox
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  chat_id INTEGER,
+                  text TEXT NOT NULL,
+                  parse_mode TEXT,
+                  status TEXT DEFAULT 'pending',
+                  attempts INTEGER DEFAULT 0,
+                  next_attempt_at REAL DEFAULT 0,
+                  last_error TEXT,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_outbox_pending
+                 ON outbox(next_attempt_at) WHERE status = 'pending' ''')
+    # Устаревшая таблица: до миграции 13 здесь хранился chat_id мастера.
+    # Сейчас ее только читает миграция 13 при переносе в tenants, никто не пишет
+    conn.execute('''CREATE TABLE IF NOT EXISTS settings
+                 (key TEXT PRIMARY KEY,
+                  value TEXT)''')
+
+
+def _persistence(conn):
+    # Состояние диалогов и user_data для SQLitePersistence, по строке на ключ
+    conn.execute('''CREATE TABLE IF NOT EXISTS conversations
+                 (name TEXT NOT NULL,
+                  key TEXT NOT NULL,
+                  state INTEGER,
+                  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                  PRIMARY KEY (name, key))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_data
+                 (user_id INTEGER PRIMARY KEY,
+                  data TEXT NOT NULL,
+                  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+
+def _reminders(conn):
+    # Кому напоминать (Telegram user_id, он же chat_id личного чата) и
+    # когда напоминание уже поставлено в отправку
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(appointments)")}
+    if 'user_id' not in columns:
+        conn.execute("ALTER TABLE appointments ADD COLUMN user_id INTEGER")
+    if 'reminded_at' not in columns:
+        conn.execute("ALTER TABLE appointments ADD COLUMN reminded_at TIMESTAMP")
+
+
+def _daily_stats(conn):
+    # Сводка по дням для панели мастера, заполняется из appointments
+    conn.execute('''CREATE TABLE IF NOT EXISTS daily_stats
+                 (day TEXT PRIMARY KEY,
+                  bookings INTEGER DEFAULT 0,
+                  cancellations INTEGER DEFAULT 0,
+                  revenue INTEGER DEFAULT 0)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS daily_service_stats
+                 (day TEXT NOT NULL,
+                  service_key TEXT NOT NULL,
+                  bookings INTEGER DEFAULT 0,
+                  revenue INTEGER DEFAULT 0,
+                  PRIMARY KEY (day, service_key))''')
+    # Заполнение по схеме этой версии (без архива и салонов); дальнейшие
+    # сверки делает stats.rebuild
+    conn.execute('''INSERT OR REPLACE INTO daily_stats (day, bookings, cancellations, revenue)
+                    SELECT day, SUM(status = 'active'), SUM(status = 'cancelled'),
+                           SUM(CASE WHEN status = 'active' THEN price ELSE 0 END)
+                    FROM appointments WHERE day IS NOT NULL GROUP BY day''')
+    conn.execute('''INSERT OR REPLACE INTO daily_service_stats (day, service_key, bookings, revenue)
+                    SELECT day, service_key, COUNT(*), SUM(price)
+                    FROM appointments WHERE day IS NOT NULL AND status = 'active'
+                    GROUP BY day, service_key''')
+
+
+def _export_indexes(conn):
+    # Фильтр /export по датам для клиентов и отзывов
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clients_created_at ON clients(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_created_at ON reviews(created_at)")
+
+
+def _client_identity(conn):
+    # Клиент по Telegram user_id и телефон в E.164 как целое число
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(clients)")}
+    if 'user_id' not in columns:
+        conn.execute("ALTER TABLE clients ADD COLUMN user_id INTEGER")
+    if 'phone_e164' not in columns:
+        conn.execute("ALTER TABLE clients ADD COLUMN phone_e164 INTEGER")
+
+    conn.execute(f'''UPDATE clients SET phone_e164 = CAST('7' || substr(digits, -10) AS INTEGER)
+                     FROM (SELECT id AS client_id, {SQL_PHONE_DIGITS} AS digits FROM clients)
+                     WHERE id = client_id AND digits NOT GLOB '*[^0-9]*'
+                     AND (length(digits) = 10 OR (length(digits) = 11 AND substr(digits, 1, 1) IN ('7', '8')))''')
+    conn.execute('''UPDATE clients SET user_id =
+                        (SELECT user_id FROM appointments
+                         WHERE appointments.phone = clients.phone AND user_id IS NOT NULL
+                         ORDER BY appointments.id DESC LIMIT 1)''')
+    # Дубли после нормализации сливаются в строку с каноничной записью
+    # '+7...': визиты и суммы складываются, последний визит — самый поздний,
+    # user_id — последнего из клиентов, у кого он есть
+    rows = conn.execute('''SELECT phone_e164, id, visits_count, total_spent, last_visit, user_id FROM clients
+                           WHERE phone_e164 IN (SELECT phone_e164 FROM clients WHERE phone_e164 IS NOT NULL
+                                                GROUP BY phone_e164 HAVING COUNT(*) > 1)
+                           ORDER BY phone_e164, phone = '+' || phone_e164 DESC, id''').fetchall()
+    merged = 0
+    for _, group in groupby(rows, key=lambda row: row[0]):
+        group = list(group)
+        keep_id = group[0][1]
+        visits = sum(row[2] or 0 for row in group)
+        spent = sum(row[3] or 0 for row in group)
+        last_visit = max((row[4] for row in group if row[4]), key=lambda day: day[6:] + day[3:5] + day[:2],
+                         default=None)
+        user_id = next((row[5] for row in sorted(group, key=lambda row: -row[1]) if row[5] is not None), None)
+        conn.executemany("DELETE FROM clients WHERE id = ?", [(row[1],) for row in group[1:]])
+        conn.execute("UPDATE clients SET visits_count = ?, total_spent = ?, last_visit = ?, user_id = ? WHERE id = ?",
+                     (visits, spent, last_visit, user_id, keep_id))
+        merged += len(group) - 1
+    if merged:
+        logger.info(f"Миграция: слито дублей клиентов по телефону: {merged}")
+    conn.execute('''UPDATE clients SET user_id = NULL WHERE id IN
+                    (SELECT id FROM (SELECT id, ROW_NUMBER() OVER (
+                                         PARTITION BY user_id ORDER BY id DESC) AS n
+                                     FROM clients WHERE user_id IS NOT NULL)
+                     WHERE n > 1)''')
+
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_clients_phone_e164 ON clients(phone_e164)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_clients_user_id ON clients(user_id)")
+    # «Мои записи»: диапазон по (user_id, day) среди активных
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_appointments_user
+                 ON appointments(user_id, day, minute) WHERE status = 'active' ''')
+
+
+def _review_stats(conn):
+    # Агрегат оценок одной строкой, обновляется вместе со вставкой отзыва
+    conn.execute('''CREATE TABLE IF NOT EXISTS review_stats
+                 (id INTEGER PRIMARY KEY CHECK (id = 1),
+                  count INTEGER DEFAULT 0,
+                  sum INTEGER DEFAULT 0,
+                  r1 INTEGER DEFAULT 0, r2 INTEGER DEFAULT 0, r3 INTEGER DEFAULT 0,
+                  r4 INTEGER DEFAULT 0, r5 INTEGER DEFAULT 0)''')
+    conn.execute('''INSERT OR REPLACE INTO review_stats (id, count, sum, r1, r2, r3, r4, r5)
+                    SELECT 1, COUNT(*), COALESCE(SUM(rating), 0),
+                           COUNT(*) FILTER (WHERE rating = 1), COUNT(*) FILTER (WHERE rating = 2),
+                           COUNT(*) FILTER (WHERE rating = 3), COUNT(*) FILTER (WHERE rating = 4),
+                           COUNT(*) FILTER (WHERE rating = 5)
+                    FROM reviews WHERE rating BETWEEN 1 AND 5''')
+
+
+def _archive(conn):
+    # Холодный архив прошедших записей с теми же столбцами, что у appointments.
+    # Выполняется вне транзакции: смена auto_vacuum требует VACUUM.
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("CREATE TABLE IF NOT EXISTS appointments_archive AS SELECT * FROM appointments WHERE 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_archive_day ON appointments_archive(day)")
+    conn.execute("COMMIT")
+    # Место после архивации возвращается пачками через incremental_vacuum
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+
+def _tenants(conn):
+    # Салоны и мастера: услуги, часы работы и вместимость дня из таблиц.
+    # Любое изменение tenant_services или tenants увеличивает tenants.version —
+    # по нему процессы бота перечитывают настройки без перезапуска.
+    conn.execute('''CREATE TABLE IF NOT EXISTS tenants
+                 (id INTEGER PRIMARY KEY,
+                  slug TEXT UNIQUE NOT NULL,
+                  name TEXT NOT NULL,
+                  address TEXT,
+                  master_phone TEXT,
+                  master_chat_id INTEGER,
+                  times TEXT NOT NULL,
+                  day_start TEXT DEFAULT '09:00',
+                  day_end TEXT DEFAULT '20:00',
+                  breaks TEXT DEFAULT '13:00-14:00',
+                  day_capacity INTEGER,
+                  active INTEGER DEFAULT 1,
+                  version INTEGER DEFAULT 1)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS tenant_services
+                 (tenant_id INTEGER NOT NULL REFERENCES tenants(id),
+                  key TEXT NOT NULL,
+                  name TEXT NOT NULL,
+                  price INTEGER NOT NULL,
+                  duration INTEGER NOT NULL,
+                  position INTEGER DEFAULT 0,
+                  active INTEGER DEFAULT 1,
+                  PRIMARY KEY (tenant_id, key))''')
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS tenant_services_{event.lower()}_version
+                         AFTER {event} ON tenant_services BEGIN
+                             UPDATE tenants SET version = version + 1 WHERE id = {row}.tenant_id;
+                         END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS tenants_update_version
+                    AFTER UPDATE ON tenants WHEN NEW.version = OLD.version BEGIN
+                        UPDATE tenants SET version = version + 1 WHERE id = NEW.id;
+                    END''')
+
+    # Существующий салон — первый арендатор, с прежними услугами и мастером
+    master = conn.execute("SELECT value FROM settings WHERE key = 'master_chat_id'").fetchone()
+    conn.execute('''INSERT OR IGNORE INTO tenants (id, slug, name, address, master_phone, master_chat_id, times)
+                    VALUES (1, 'main', 'Салон красоты «Ольга Карре»', 'г. Москва, ул. Красивая, д. 15',
+                            '+79507050964', ?,
+                            '09:00,10:00,11:00,12:00,14:00,15:00,16:00,17:00,18:00,19:00')''',
+                 (int(master[0]) if master else None,))
+    conn.executemany('''INSERT OR IGNORE INTO tenant_services (tenant_id, key, name, price, duration, position)
+                        VALUES (1, ?, ?, ?, ?, ?)''', [
+        ('haircut_woman', '💇 Женская стрижка', 1500, 60, 1),
+        ('haircut_man', '💇‍♂️ Мужская стрижка', 800, 45, 2),
+        ('haircut_child', '👧 Детская стрижка', 700, 40, 3),
+        ('coloring', '🎨 Окрашивание', 2500, 120, 4),
+        ('complex', '✨ Комплекс (стрижка+укладка)', 2200, 90, 5),
+    ])
+
+    # Записи, архив и уведомления делятся по салонам
+    for table in ('appointments', 'appointments_archive'):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if 'tenant_id' not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN tenant_id INTEGER NOT NULL DEFAULT 1")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+    if 'tenant_id' not in columns:
+        conn.execute("ALTER TABLE outbox ADD COLUMN tenant_id INTEGER")
+    # Старые базы могли остаться с дублями активных записей (миграция 1 в этом
+    # случае индекс не создавала): оставляем самую раннюю, остальные отменяем.
+    # Сводку по ним поправим ниже, когда она переедет в таблицы по салонам
+    duplicates = conn.execute('''SELECT id, tenant_id, day, service_key, price FROM appointments
+                              WHERE status = 'active' AND id NOT IN (
+                                  SELECT MIN(id) FROM appointments WHERE status = 'active'
+                                  GROUP BY tenant_id, date, time)''').fetchall()
+    conn.executemany("UPDATE appointments SET status = 'cancelled' WHERE id = ?",
+                     [(row[0],) for row in duplicates])
+    if duplicates:
+        logger.warning(f"Отменено дублей активных записей на одно время: {len(duplicates)}")
+    conn.execute("DROP INDEX IF EXISTS idx_appointments_active_slot")
+    conn.execute('''CREATE UNIQUE INDEX idx_appointments_active_slot
+                 ON appointments(tenant_id, date, time) WHERE status = 'active' ''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_appointments_tenant_day
+                 ON appointments(tenant_id, day, status, minute, duration)''')
+
+    # Сводка для панели мастера — по салонам
+    conn.execute("ALTER TABLE daily_stats RENAME TO daily_stats_old")
+    conn.execute('''CREATE TABLE daily_stats
+                 (tenant_id INTEGER NOT NULL,
+                  day TEXT NOT NULL,
+                  bookings INTEGER DEFAULT 0,
+                  cancellations INTEGER DEFAULT 0,
+                  revenue INTEGER DEFAULT 0,
+                  PRIMARY KEY (tenant_id, day))''')
+    conn.execute('''INSERT INTO daily_stats (tenant_id, day, bookings, cancellations, revenue)
+                    SELECT 1, day, bookings, cancellations, revenue FROM daily_stats_old''')
+    conn.execute("DROP TABLE daily_stats_old")
+    conn.execute("ALTER TABLE daily_service_stats RENAME TO daily_service_stats_old")
+    conn.execute('''CREATE TABLE daily_service_stats
+                 (tenant_id INTEGER NOT NULL,
+                  day TEXT NOT NULL,
+                  service_key TEXT NOT NULL,
+                  bookings INTEGER DEFAULT 0,
+                  revenue INTEGER DEFAULT 0,
+                  PRIMARY KEY (tenant_id, day, service_key))''')
+    conn.execute('''INSERT INTO daily_service_stats (tenant_id, day, service_key, bookings, revenue)
+                    SELECT 1, day, service_key, bookings, revenue FROM daily_service_stats_old''')
+    conn.execute("DROP TABLE daily_service_stats_old")
+    # Отмененные дубли — как отмена в stats.record_cancellation этой версии
+    for _, tenant_id, day, service_key, price in duplicates:
+        conn.execute('''UPDATE daily_stats SET bookings = bookings - 1, cancellations = cancellations + 1,
+                                               revenue = revenue - ?
+                        WHERE tenant_id = ? AND day = ?''', (price or 0, tenant_id, day))
+        conn.execute('''UPDATE daily_service_stats SET bookings = bookings - 1, revenue = revenue - ?
+                        WHERE tenant_id = ? AND day = ? AND service_key = ?''',
+                     (price or 0, tenant_id, day, service_key))
+
+
+def _search(conn):
+    # Полнотекстовый поиск для /find: FTS5 с внешним содержимым (хранится
+    # только индекс, текст берется из clients и appointments). Триггеры
+    # держат индекс в согласованном состоянии; prefix='2 3' ускоряет
+    # поиск по началу слова и номера.
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+                        name, phone_e164, content='clients', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS appointments_fts USING fts5(
+                        name, phone, notes, content='appointments', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+    for table, columns in (('clients', ('name', 'phone_e164')), ('appointments', ('name', 'phone', 'notes'))):
+        names = ', '.join(columns)
+        new = ', '.join(f'NEW.{column}' for column in columns)
+        old = ', '.join(f'OLD.{column}' for column in columns)
+        changed = ' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in columns)
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                             INSERT INTO {table}_fts (rowid, {names}) VALUES (NEW.id, {new});
+                         END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                             INSERT INTO {table}_fts ({table}_fts, rowid, {names}) VALUES ('delete', OLD.id, {old});
+                         END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {names} ON {table}
+                         WHEN {changed} BEGIN
+                             INSERT INTO {table}_fts ({table}_fts, rowid, {names}) VALUES ('delete', OLD.id, {old});
+                             INSERT INTO {table}_fts (rowid, {names}) VALUES (NEW.id, {new});
+                         END''')
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+
+# (версия, описание, функция, выполнять ли в одной транзакции)
+MIGRATIONS = [
+    (1, 'начальная схема', _initial_schema, True),
+    (2, 'столбцы day и minute', _sortable_columns, True),
+    (3, 'заполнение day и minute', _backfill_sortable_columns, False),
+    (4, 'индексы по day, phone, created_at', _indexes, True),
+    (5, 'outbox и settings', _outbox, True),
+    (6, 'conversations и user_data', _persistence, True),
+    (7, 'user_id и reminded_at в appointments', _reminders, True),
+    (8, 'daily_stats', _daily_stats, True),
+    (9, 'индексы по created_at для выгрузки', _export_indexes, True),
+    (10, 'user_id и телефон E.164 у клиентов', _client_identity, True),
+    (11, 'review_stats', _review_stats, True),
+    (12, 'архив appointments_archive и incremental auto_vacuum', _archive, False),
+    (13, 'салоны, услуги и разделение записей по салонам', _tenants, True),
+    (14, 'полнотекстовый поиск clients_fts и appointments_fts', _search, True),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def ensure_schema(conn):
+    # Быстрый путь запуска: схема уже актуальна — одно чтение user_version
+    # без транзакций и обращений к sqlite_master
+    current = schema_version(conn)
+    if current == SCHEMA_VERSION:
+        return current
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(f"Схема базы {current} новее кода ({SCHEMA_VERSION})")
+    logger.info(f"Схема базы {current}, обновление до {SCHEMA_VERSION}")
+    return migrate(conn)
+
+
+def migrate(conn):
+    # Применяет недостающие миграции по PRAGMA user_version.
+    # conn должен быть в режиме autocommit (isolation_level=None).
+    current = schema_version(conn)
+    for version, description, fn, transactional in MIGRATIONS:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        if transactional:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                fn(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        else:
+            # Пакетные миграции идемпотентны и коммитят сами
+            fn(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        logger.info(f"Миграция {version} ({description}): {(time.perf_counter() - started) * 1000:.1f} мс")
+        current = version
+    return current
@@ -0,0 +1,145 @@
+import time
+import asyncio
+import logging
+
+from telegram.error import RetryAfter, Forbidden, BadRequest
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: ~30 сообщений в секунду всего и ~1 в секунду в один чат
+GLOBAL_RATE = 25
+PER_CHAT_RATE = 1
+
+BATCH_SIZE = 20
+POLL_INTERVAL = 5
+MAX_ATTEMPTS = 8
+BASE_BACKOFF = 2
+MAX_BACKOFF = 600
+
+
+def enqueue(conn, chat_id, text, parse_mode='HTML', tenant_id=None):
+    # Вызывается внутри транзакции вместе с изменением, о котором уведомляем.
+    # chat_id=None — сообщение мастеру салона tenant_id.
+    conn.execute("INSERT INTO outbox (chat_id, text, parse_mode, tenant_id) VALUES (?, ?, ?, ?)",
+                 (chat_id, text, parse_mode, tenant_id))
+
+
+def backoff(attempts):
+    return min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempts)
+
+
+class OutboxDispatcher:
+    # Фоновая задача: забирает накопившиеся уведомления пачками и
+    # отправляет их с учетом лимитов Telegram. Неудачные отправки
+    # повторяются с экспоненциальной задержкой.
+
+    def __init__(self):
+        self.bot = None
+        self.db = None
+        # master_chat_id(tenant_id) -> chat_id мастера салона или None
+        self.master_chat_id = lambda tenant_id: None
+        self._global = TokenBucket(GLOBAL_RATE)
+        self._chats = {}
+        self._wake = None
+        self._task = None
+
+    def start(self, bot, db, master_chat_id):
+        self.bot = bot
+        self.db = db
+        self.master_chat_id = master_chat_id
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 1000:
+                # Полные корзины ничем не отличаются от новых — выбрасываем их
+                self._chats = {key: value for key, value in self._chats.items()
+                               if value.delay(value.capacity) > 0}
+            bucket = self._chats[chat_id] = TokenBucket(PER_CHAT_RATE)
+        return bucket
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.drain()
+            except Exception as e:
+                logger.error(f"Ошибка отправки уведомлений: {e}")
+                processed = 0
+            if processed >= BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def drain(self):
+        now = time.time()
+        rows = await self.db.fetchall("""SELECT id, chat_id, text, parse_mode, attempts, tenant_id FROM outbox
+                                         WHERE status = 'pending' AND next_attempt_at <= ?
+                                         ORDER BY id LIMIT ?""",
+                                      (now, BATCH_SIZE), label='outbox_fetch')
+        if not rows:
+            return 0
+
+        sent = []
+        retries = []
+        failed = []
+        for message_id, chat_id, text, parse_mode, attempts, tenant_id in rows:
+            if chat_id is None:
+                chat_id = self.master_chat_id(tenant_id)
+                if chat_id is None:
+                    # Мастер не известен: настройки салонов еще грузятся или мастер
+                    # не задан вовсе. Откладываем, но не бесконечно
+                    if attempts + 1 >= MAX_ATTEMPTS:
+                        failed.append(("мастер салона не задан", message_id))
+                    else:
+                        retries.append((attempts + 1, time.time() + POLL_INTERVAL * 12, None, message_id))
+                    continue
+            await self._global.acquire()
+            await self._chat_bucket(chat_id).acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                sent.append((message_id,))
+            except RetryAfter as e:
+                retries.append((attempts, time.time() + float(e.retry_after), str(e), message_id))
+            except (Forbidden, BadRequest) as e:
+                failed.append((str(e), message_id))
+            except Exception as e:
+                if attempts + 1 >= MAX_ATTEMPTS:
+                    failed.append((str(e), message_id))
+                else:
+                    retries.append((attempts + 1, time.time() + backoff(attempts), str(e), message_id))
+
+        def apply(conn):
+            conn.executemany("UPDATE outbox SET status = 'sent', attempts = attempts + 1 WHERE id = ?", sent)
+            conn.executemany("""UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?
+                                WHERE id = ?""", retries)
+            conn.executemany("""UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ?
+                                WHERE id = ?""", failed)
+
+        await self.db.transaction(apply, label='outbox_update')
+        if failed:
+            logger.error(f"Не удалось доставить {len(failed)} уведомлений: {failed[0][0]}")
+        return len(rows)
+
+
+dispatcher = OutboxDispatcher()
@@ -0,0 +1,147 @@
+import json
+import asyncio
+import logging
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# Незавершенные диалоги старше этого срока при запуске не восстанавливаются
+CONVERSATION_TTL_DAYS = 3
+
+
+class SQLitePersistence(BasePersistence):
+    # Состояния ConversationHandler и user_data хранятся построчно в
+    # appointments.db. Пишутся только изменившиеся ключи, одной транзакцией
+    # на цикл update_persistence. user_data при запуске не читается целиком:
+    # данные пользователя подгружаются при первом его обновлении.
+
+    def __init__(self, db, update_interval=5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = db
+        self._loaded_users = set()
+        self._written = {}
+        self._dirty_users = {}
+        self._dirty_conversations = {}
+        self._flush_task = None
+
+    # --- чтение ---
+
+    async def get_user_data(self):
+        return {}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        def load(conn):
+            conn.execute("DELETE FROM conversations WHERE updated_at < datetime('now', ?)",
+                         (f"-{CONVERSATION_TTL_DAYS} days",))
+            return conn.execute("SELECT key, state FROM conversations WHERE name = ?", (name,)).fetchall()
+
+        rows = await self.db.run(load, label='persistence_load_conversations')
+        return {tuple(json.loads(key)): state for key, state in rows}
+
+    async def refresh_user_data(self, user_id, user_data):
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        row = await self.db.fetchone("SELECT data FROM user_data WHERE user_id = ?", (user_id,),
+                                     label='persistence_load_user')
+        if row:
+            self._written[user_id] = hash(row[0])
+            for key, value in json.loads(row[0]).items():
+                user_data.setdefault(key, value)
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # --- запись ---
+
+    async def update_user_data(self, user_id, data):
+        payload = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        if self._written.get(user_id) == hash(payload):
+            return
+        self._dirty_users[user_id] = payload
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id):
+        self._dirty_users[user_id] = None
+        self._schedule_flush()
+
+    async def update_conversation(self, name, key, new_state):
+        self._dirty_conversations[(name, json.dumps(list(key)))] = new_state
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    def _schedule_flush(self):
+        # Application вызывает update_* пачкой через asyncio.gather — запись
+        # откладываем до конца пачки и делаем одной транзакцией
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_dirty())
+
+    async def _flush_dirty(self):
+        await asyncio.sleep(0)
+        users, self._dirty_users = self._dirty_users, {}
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        if not users and not conversations:
+            return
+
+        def write(conn):
+            conn.executemany("""INSERT INTO user_data (user_id, data, updated_at)
+                                VALUES (?, ?, CURRENT_TIMESTAMP)
+                                ON CONFLICT(user_id) DO UPDATE SET
+                                    data = excluded.data, updated_at = excluded.updated_at""",
+                             [(user_id, payload) for user_id, payload in users.items() if payload is not None])
+            conn.executemany("DELETE FROM user_data WHERE user_id = ?",
+                             [(user_id,) for user_id, payload in users.items() if payload is None])
+            conn.executemany("""INSERT INTO conversations (name, key, state, updated_at)
+                                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                                ON CONFLICT(name, key) DO UPDATE SET
+                                    state = excluded.state, updated_at = excluded.updated_at""",
+                             [(name, key, state) for (name, key), state in conversations.items()
+                              if state is not None])
+            conn.executemany("DELETE FROM conversations WHERE name = ? AND key = ?",
+                             [(name, key) for (name, key), state in conversations.items() if state is None])
+
+        try:
+            await self.db.transaction(write, label='persistence_flush')
+        except Exception as e:
+            logger.error(f"Не удалось сохранить состояние диалогов: {e}")
+            # Вернем несохраненное, не затирая более свежие изменения
+            self._dirty_users = {**users, **self._dirty_users}
+            self._dirty_conversations = {**conversations, **self._dirty_conversations}
+            return
+        for user_id, payload in users.items():
+            if payload is None:
+                self._written.pop(user_id, None)
+            else:
+                self._written[user_id] = hash(payload)
+
+    async def flush(self):
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._flush_dirty()
@@ -0,0 +1,152 @@
+import os
+import heapq
+import logging
+from datetime import datetime, date, time, timedelta
+
+from outbox import enqueue, dispatcher as outbox_dispatcher
+from tenants import tenant_registry
+from scheduling import SALON_TZ, salon_now
+
+logger = logging.getLogger(__name__)
+
+# За сколько часов до визита напоминать
+REMINDER_LEAD_HOURS = float(os.environ.get('REMINDER_LEAD_HOURS', '24'))
+# Какой горизонт напоминаний держать в памяти и как часто его догружать
+REMINDER_WINDOW_HOURS = float(os.environ.get('REMINDER_WINDOW_HOURS', '24'))
+
+
+def appointment_start(day_iso, minute):
+    # Время визита — по часам салона, а не сервера
+    return datetime.combine(date.fromisoformat(day_iso), time(minute // 60, minute % 60), tzinfo=SALON_TZ)
+
+
+def reminder_text(appointment_id, service, date_str, time_str, address):
+    return (
+        "⏰ <b>Напоминание о записи</b>\n\n"
+        f"💇 {service}\n"
+        f"📅 {date_str} в {time_str}\n\n"
+        f"📍 {address}\n"
+        f"Если планы изменились: /cancel_booking {appointment_id}"
+    )
+
+
+class ReminderScheduler:
+    # Напоминания на ближайшее окно держим в min-куче (время, id записи).
+    # Окно догружается пачкой по индексу day; подтверждения и отмены
+    # меняют кучу точечно (отмена — ленивое удаление). На JobQueue всегда
+    # стоит одна задача — на время ближайшего напоминания.
+
+    def __init__(self):
+        self.application = None
+        self.db = None
+        self._heap = []
+        self._entries = {}
+        self._loaded_until = 0.0
+        self._job = None
+        self._job_at = None
+
+    @property
+    def lead(self):
+        return timedelta(hours=REMINDER_LEAD_HOURS)
+
+    async def start(self, application, db):
+        self.application = application
+        self.db = db
+        await self.load_window()
+        interval = REMINDER_WINDOW_HOURS * 3600 / 2
+        application.job_queue.run_repeating(self._refresh_job, interval=interval, first=interval,
+                                            name='reminders_window')
+
+    async def load_window(self):
+        now = salon_now()
+        window_end = now + timedelta(hours=REMINDER_WINDOW_HOURS)
+        # Визиты, напоминание о которых попадает в окно
+        last_day = (window_end + self.lead).date().isoformat()
+        rows = await self.db.fetchall("""SELECT id, day, minute FROM appointments
+                                         WHERE day BETWEEN ? AND ? AND status = 'active'
+                                         AND reminded_at IS NULL AND user_id IS NOT NULL""",
+                                      (now.date().isoformat(), last_day), label='reminders_window')
+        self._loaded_until = window_end.timestamp()
+        for appointment_id, day_iso, minute in rows:
+            self._push(appointment_id, appointment_start(day_iso, minute))
+        self._reschedule()
+        logger.info(f"Напоминания: в очереди {len(self._entries)}")
+
+    async def _refresh_job(self, context):
+        await self.load_window()
+
+    def _push(self, appointment_id, start):
+        # Запись сделана позже, чем за REMINDER_LEAD_HOURS до визита, — клиент
+        # только что получил подтверждение, напоминание не нужно
+        remind_at = start - self.lead
+        if remind_at <= salon_now():
+            return
+        remind_at = remind_at.timestamp()
+        if remind_at > self._loaded_until or self._entries.get(appointment_id) == remind_at:
+            return
+        self._entries[appointment_id] = remind_at
+        heapq.heappush(self._heap, (remind_at, appointment_id))
+
+    def add(self, appointment_id, day_iso, minute):
+        # Новая запись: попадет в кучу, только если напоминание внутри окна
+        if self.application is None:
+            return
+        self._push(appointment_id, appointment_start(day_iso, minute))
+        self._reschedule()
+
+    def remove(self, appointment_id):
+        # Ленивое удаление: элемент кучи будет пропущен при извлечении
+        self._entries.pop(appointment_id, None)
+
+    def _top(self):
+        while self._heap and self._entries.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _reschedule(self):
+        top = self._top()
+        if top == self._job_at:
+            return
+        if self._job is not None:
+            self._job.schedule_removal()
+            self._job = None
+        self._job_at = top
+        if top is not None:
+            delay = max(0.0, top - salon_now().timestamp())
+            self._job = self.application.job_queue.run_once(self._wake, when=delay, name='reminders_due')
+
+    async def _wake(self, context):
+        self._job = None
+        self._job_at = None
+        now = salon_now().timestamp()
+        due = []
+        while self._top() is not None and self._heap[0][0] <= now:
+            remind_at, appointment_id = heapq.heappop(self._heap)
+            del self._entries[appointment_id]
+            due.append(appointment_id)
+        if due:
+            await self._send(due)
+        self._reschedule()
+
+    async def _send(self, appointment_ids):
+        # Пачка напоминаний — одна транзакция в outbox; лимиты и повторы
+        # отправки обеспечивает outbox_dispatcher
+        def write(conn):
+            placeholders = ','.join('?' * len(appointment_ids))
+            rows = conn.execute(f"""SELECT id, user_id, service, date, time, tenant_id FROM appointments
+                                    WHERE id IN ({placeholders}) AND status = 'active'
+                                    AND reminded_at IS NULL""", appointment_ids).fetchall()
+            for appointment_id, user_id, service, date_str, time_str, tenant_id in rows:
+                address = tenant_registry.get(tenant_id).address
+                enqueue(conn, user_id, reminder_text(appointment_id, service, date_str, time_str, address),
+                        tenant_id=tenant_id)
+            conn.executemany("UPDATE appointments SET reminded_at = CURRENT_TIMESTAMP WHERE id = ?",
+                             [(row[0],) for row in rows])
+            return len(rows)
+
+        sent = await self.db.transaction(write, label='reminders_enqueue')
+        outbox_dispatcher.wake()
+        logger.info(f"Напоминания: поставлено в отправку {sent}")
+
+
+reminders = ReminderScheduler()
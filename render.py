@@ -0,0 +1,142 @@
+from datetime import date, timedelta
+
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+
+# Готовые клавиатуры и шаблоны сообщений. Статичные разметки строятся один
+# раз при создании Renderer (объекты telegram неизменяемы, их можно
+# отдавать всем обновлениям), клавиатуры дат и времени запоминаются по
+# версии дня из AvailabilityIndex и перестраиваются только после записи
+# или отмены на этот день.
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+CALENDAR_DAYS = 7
+DEFAULT_SALON = "Салон красоты 'Ольга Карре'"
+
+WELCOME_TEMPLATE = (
+    "👋 <b>Добро пожаловать, {first_name}!</b>\n\n"
+    "✨ <b>{salon}</b>\n\n"
+    "💫 <b>Мы предлагаем:</b>\n"
+    "• Профессиональные стрижки\n"
+    "• Модное окрашивание\n"
+    "• Стильные укладки\n\n"
+    "📋 <b>Основные команды:</b>\n"
+    "• /book - 📝 Новая запись\n"
+    "• /my_bookings - 📋 Мои записи\n"
+    "• /services - 💰 Услуги и цены\n"
+    "• /reviews - ⭐ Отзывы\n"
+    "• /contacts - 📞 Контакты"
+)
+
+CHOOSE_SERVICE_TEXT = "✨ <b>Выберите услугу:</b>"
+
+CHOOSE_TIME_TEMPLATE = "🕒 <b>Выберите время на {date}:</b>\nУслуга: <b>{service}</b>"
+
+BACK_TO_DATES_TEMPLATE = "📅 <b>Выберите дату:</b>\n\n💇 Услуга: <b>{service}</b>"
+
+CONFIRMATION_TEMPLATE = (
+    "📋 <b>ПОДТВЕРЖДЕНИЕ ЗАПИСИ</b>\n\n"
+    "👤 <b>Имя:</b> {name}\n"
+    "📱 <b>Телефон:</b> {phone}\n"
+    "💇 <b>Услуга:</b> {service}\n"
+    "💰 <b>Стоимость:</b> {price}₽\n"
+    "📅 <b>Дата:</b> {date}\n"
+    "🕒 <b>Время:</b> {time}\n\n"
+    "<i>Все верно? Подтвердите запись</i>"
+)
+
+
+class Renderer:
+
+    def __init__(self, services, availability, salon=DEFAULT_SALON):
+        self.services = services
+        self.availability = availability
+        self.salon = salon
+
+        self.main_menu = InlineKeyboardMarkup([
+            [InlineKeyboardButton("📝 Записаться онлайн", callback_data="quick_book")],
+            [InlineKeyboardButton("💰 Услуги и цены", callback_data="show_services")],
+            [InlineKeyboardButton("⭐ Оставить отзыв", callback_data="leave_review")],
+            [InlineKeyboardButton("📞 Контакты", callback_data="show_contacts")],
+        ])
+        self.services_menu = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(f"{service['name']} - {service['price']}₽", callback_data=f"service_{key}")]
+             for key, service in services.items()]
+            + [[InlineKeyboardButton("❌ Отмена", callback_data="cancel_booking")]])
+        # Кнопка подтверждения несет токен записи, остальные строки общие
+        self._confirm_rows = (
+            (InlineKeyboardButton("✏️ Изменить данные", callback_data="confirm_edit"),),
+            (InlineKeyboardButton("❌ Отменить", callback_data="confirm_no"),),
+        )
+        # Заголовок выбора даты для каждой услуги
+        self.choose_date_texts = {
+            key: (f"📅 <b>Выберите дату:</b>\n\n"
+                  f"💇 Услуга: <b>{service['name']}</b>\n"
+                  f"💰 Стоимость: <b>{service['price']}₽</b>\n"
+                  f"⏱ Время: <b>{service['duration']} мин.</b>")
+            for key, service in services.items()
+        }
+
+        self._today = None
+        self._calendar = []
+        # (длительность, подпись «назад») -> (версии дней, разметка)
+        self._dates = {}
+        # (дата, длительность) -> (версия дня, разметка)
+        self._times = {}
+
+    def _roll_day(self):
+        # Новый день: прошедшие даты больше не нужны, календарь сдвигается
+        today = date.today()
+        if today != self._today:
+            self._today = today
+            self._calendar = [
+                (day.strftime('%d.%m.%Y'), WEEKDAYS[day.weekday()])
+                for day in (today + timedelta(days=i) for i in range(CALENDAR_DAYS))
+                if day.weekday() < 5  # Только рабочие дни (Пн-Пт)
+            ]
+            self._dates.clear()
+            self._times.clear()
+
+    def in_calendar(self, date_str):
+        # Дата из callback_data есть среди дней, которые сейчас предлагаются
+        self._roll_day()
+        return any(day == date_str for day, _ in self._calendar)
+
+    def welcome(self, first_name):
+        return WELCOME_TEMPLATE.format(first_name=first_name, salon=self.salon)
+
+    def date_keyboard(self, duration, back_text="◀️ Назад"):
+        # Показываем только дни, где услуга еще помещается
+        self._roll_day()
+        versions = tuple(self.availability.version(date_str) for date_str, _ in self._calendar)
+        cached = self._dates.get((duration, back_text))
+        if cached and cached[0] == versions:
+            return cached[1]
+        keyboard = [[InlineKeyboardButton(f"{date_str} ({weekday})", callback_data=f"date_{date_str}")]
+                    for date_str, weekday in self._calendar
+                    if self.availability.has_capacity(date_str, duration)]
+        keyboard.append([InlineKeyboardButton(back_text, callback_data="quick_book")])
+        markup = InlineKeyboardMarkup(keyboard)
+        self._dates[(duration, back_text)] = (versions, markup)
+        return markup
+
+    def time_keyboard(self, date_str, duration):
+        self._roll_day()
+        version = self.availability.version(date_str)
+        cached = self._times.get((date_str, duration))
+        if cached and cached[0] == version:
+            return cached[1]
+        buttons = [InlineKeyboardButton(time, callback_data=f"time_{time}")
+                   for time in self.availability.free_times(date_str, duration)]
+        keyboard = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+        keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="back_to_dates")])
+        markup = InlineKeyboardMarkup(keyboard)
+        self._times[(date_str, duration)] = (version, markup)
+        return markup
+
+    def confirmation(self, user_data):
+        text = CONFIRMATION_TEMPLATE.format(
+            name=user_data['name'], phone=user_data['phone'], service=user_data['service'],
+            price=user_data['price'], date=user_data['date'], time=user_data['time'])
+        confirm = InlineKeyboardButton("✅ Подтвердить запись",
+                                       callback_data=f"confirm_yes:{user_data['booking_token']}")
+        return text, InlineKeyboardMarkup(((confirm,),) + self._confirm_rows)
@@ -0,0 +1,115 @@
+import time
+import threading
+
+from telegram.ext import filters
+
+# Отзывы: фильтр «ждем отзыв», постраничный просмотр по ключу id и
+# агрегат оценок, который обновляется вместе со вставкой отзыва.
+
+PAGE_SIZE = 5
+# Сколько секунд после «Оставить отзыв» следующее сообщение считается отзывом
+REVIEW_PENDING_TTL = 10 * 60
+
+
+class ReviewPending(filters.MessageFilter):
+    # Пропускает только сообщения пользователей, нажавших «Оставить отзыв».
+    # Проверка — поиск в словаре, до persistence и остальных обработчиков.
+    # Ожидание истекает через REVIEW_PENDING_TTL секунд, чтобы забытый отзыв
+    # не перехватил потом имя или телефон в диалоге записи.
+
+    def __init__(self):
+        super().__init__(name='ReviewPending')
+        # user_id -> time.monotonic(), до которого ждем отзыв
+        self.users = {}
+
+    def add(self, user_id):
+        self.users[user_id] = time.monotonic() + REVIEW_PENDING_TTL
+
+    def discard(self, user_id):
+        self.users.pop(user_id, None)
+
+    def filter(self, message):
+        if message.from_user is None:
+            return False
+        deadline = self.users.get(message.from_user.id)
+        if deadline is None:
+            return False
+        if deadline < time.monotonic():
+            self.discard(message.from_user.id)
+            return False
+        return True
+
+
+review_pending = ReviewPending()
+
+
+def insert_review(conn, client_name, phone, rating, text):
+    # Вызывается внутри db.transaction: отзыв и агрегат меняются вместе
+    cursor = conn.execute("INSERT INTO reviews (client_name, phone, rating, text) VALUES (?, ?, ?, ?)",
+                          (client_name, phone, rating, text))
+    if rating:
+        conn.execute(f"""UPDATE review_stats SET count = count + 1, sum = sum + ?, r{rating} = r{rating} + 1
+                         WHERE id = 1""", (rating,))
+    return cursor.lastrowid
+
+
+def load_stats(conn):
+    row = conn.execute("SELECT count, sum, r1, r2, r3, r4, r5 FROM review_stats WHERE id = 1").fetchone()
+    return (row[0], row[1], list(row[2:])) if row else (0, 0, [0] * 5)
+
+
+def page(conn, cursor=None, direction='older', size=PAGE_SIZE):
+    # Страница отзывов от новых к старым по ключу id: O(size) на любой
+    # глубине. Возвращает (строки, есть_новее, есть_старее).
+    if direction == 'newer':
+        rows = conn.execute("""SELECT id, client_name, rating, text FROM reviews
+                               WHERE id > ? ORDER BY id LIMIT ?""", (cursor, size + 1)).fetchall()
+        has_newer = len(rows) > size
+        return rows[:size][::-1], has_newer, True
+    if cursor is None:
+        rows = conn.execute("SELECT id, client_name, rating, text FROM reviews ORDER BY id DESC LIMIT ?",
+                            (size + 1,)).fetchall()
+    else:
+        rows = conn.execute("""SELECT id, client_name, rating, text FROM reviews
+                               WHERE id < ? ORDER BY id DESC LIMIT ?""", (cursor, size + 1)).fetchall()
+    return rows[:size], cursor is not None, len(rows) > size
+
+
+class RatingCache:
+    # Агрегат оценок в памяти: загружается один раз, дальше обновляется
+    # после каждого записанного отзыва
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.histogram = [0] * 5
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    async def get(self, db):
+        if not self.loaded:
+            count, total, histogram = await db.run(load_stats, label='review_stats')
+            with self._lock:
+                if not self.loaded:
+                    self.count, self.sum, self.histogram = count, total, histogram
+                    self.loaded = True
+        return self
+
+    def add(self, rating):
+        if not rating or not self.loaded:
+            return
+        with self._lock:
+            self.count += 1
+            self.sum += rating
+            self.histogram[rating - 1] += 1
+
+    def invalidate(self):
+        # Отзывы могли записать другие процессы — перечитаем при следующем get
+        self.loaded = False
+
+    @property
+    def average(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+ratings = RatingCache()
@@ -0,0 +1,113 @@
+import os
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Часовой пояс салонов: время записей, напоминаний и ночного обслуживания.
+# Сервер (Railway) обычно живет в UTC, поэтому локальное время системы не годится
+SALON_TZ = ZoneInfo(os.environ.get('SALON_TZ', 'Europe/Moscow'))
+
+# Рабочий день и перерыв по умолчанию (в минутах от начала суток)
+DAY_START = 9 * 60
+DAY_END = 20 * 60
+BREAKS = [(13 * 60, 14 * 60)]
+
+
+def to_minutes(time_str):
+    hours, minutes = time_str.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def from_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def salon_now():
+    return datetime.now(SALON_TZ)
+
+
+def iso_day(date_str):
+    # 'ДД.ММ.ГГГГ' -> 'ГГГГ-ММ-ДД' (столбец appointments.day)
+    day, month, year = date_str.split('.')
+    return f"{year}-{month}-{day}"
+
+
+def parse_breaks(text):
+    # '13:00-14:00,16:30-16:45' -> [(780, 840), (990, 1005)]
+    breaks = []
+    for part in (text or '').split(','):
+        if part.strip():
+            start, end = part.split('-')
+            breaks.append((to_minutes(start.strip()), to_minutes(end.strip())))
+    return breaks
+
+
+class WorkingHours:
+    # Рабочий день салона и перерывы, в минутах от начала суток
+
+    __slots__ = ('start', 'end', 'breaks')
+
+    def __init__(self, start=DAY_START, end=DAY_END, breaks=BREAKS):
+        self.start = start
+        self.end = end
+        self.breaks = list(breaks)
+
+    def allows(self, start, end):
+        if start < self.start or end > self.end:
+            return False
+        for break_start, break_end in self.breaks:
+            if start < break_end and break_start < end:
+                return False
+        return True
+
+
+DEFAULT_HOURS = WorkingHours()
+
+
+class DaySchedule:
+    # Занятые интервалы одного дня [start, end) в минутах. Интервалы не
+    # пересекаются и хранятся отсортированными по началу, поэтому проверка
+    # «свободен ли интервал» — это один бинарный поиск.
+
+    __slots__ = ('starts', 'ends', 'hours')
+
+    def __init__(self, hours=DEFAULT_HOURS):
+        self.starts = []
+        self.ends = []
+        self.hours = hours
+
+    def __len__(self):
+        return len(self.starts)
+
+    def is_free(self, start, end):
+        if not self.hours.allows(start, end):
+            return False
+        i = bisect_right(self.starts, start)
+        # Предыдущий интервал должен закончиться до нашего начала,
+        # следующий — начаться не раньше нашего конца
+        if i and self.ends[i - 1] > start:
+            return False
+        if i < len(self.starts) and self.starts[i] < end:
+            return False
+        return True
+
+    def add(self, start, end):
+        # Возвращает False, если интервал пересекается с уже занятым
+        i = bisect_right(self.starts, start)
+        if (i and self.ends[i - 1] > start) or (i < len(self.starts) and self.starts[i] < end):
+            return False
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        return True
+
+    def remove(self, start, end):
+        i = bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start and self.ends[i] == end:
+            del self.starts[i]
+            del self.ends[i]
+            return True
+        return False
+
+    def fitting_starts(self, candidates, duration):
+        # Какие из начал candidates (минуты) вмещают услугу длительностью duration
+        return [start for start in candidates if self.is_free(start, start + duration)]
@@ -0,0 +1,62 @@
+import re
+
+# Поиск мастера по клиентам и записям: FTS5-индексы clients_fts и
+# appointments_fts (миграция 14). Каждое слово запроса ищется по началу
+# токена, результаты ранжируются bm25 и отдаются страницами.
+#
+# bm25 считается для каждого совпадения, и на частом слове («Анна») это
+# тысячи строк. Поэтому ранжируются только RANK_WINDOW самых новых
+# совпадений каждого вида: индекс отдает их по rowid без сортировки, и
+# поиск занимает единицы миллисекунд при любом размере базы.
+
+PAGE_SIZE = 5
+RANK_WINDOW = 200
+# Вес столбцов в bm25: совпадение в имени важнее, чем в заметке
+CLIENT_WEIGHTS = (10.0, 5.0)
+APPOINTMENT_WEIGHTS = (10.0, 5.0, 1.0)
+
+_PHONE_CHARS = re.compile(r'[\s\-()+]')
+
+
+def match_query(text):
+    # Текст пользователя -> выражение MATCH. Номер телефона в любой записи
+    # ('8 912 345', '+7(912)') приводится к цифрам E.164, как в индексе.
+    # Остальное — слова с префиксным поиском; кавычки экранируются, поэтому
+    # синтаксис FTS5 (OR, NEAR, *) из запроса не интерпретируется.
+    digits = _PHONE_CHARS.sub('', text)
+    if digits.isdigit():
+        if digits[0] == '8':
+            digits = '7' + digits[1:]
+        elif digits[0] == '9':
+            digits = '7' + digits
+        return f'"{digits}"*'
+    terms = [word.replace('"', '""') for word in text.split() if any(ch.isalnum() for ch in word)]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def find(conn, text, tenant_id, offset=0, size=PAGE_SIZE, include_clients=True):
+    # Возвращает (строки, есть_еще). Строка: (вид, id, имя, телефон, дата,
+    # время, услуга или число визитов, статус). Клиенты общие для всех
+    # салонов, поэтому их показываем только владельцу (include_clients).
+    query = match_query(text)
+    if not query:
+        return [], False
+    parts = []
+    params = []
+    if include_clients:
+        parts.append(f"""SELECT * FROM (
+                             SELECT 'client', c.id, c.name, c.phone_e164, c.last_visit, NULL, c.visits_count, NULL,
+                                    bm25(clients_fts, {', '.join(map(str, CLIENT_WEIGHTS))}) AS rank
+                             FROM clients_fts JOIN clients c ON c.id = clients_fts.rowid
+                             WHERE clients_fts MATCH ? ORDER BY clients_fts.rowid DESC LIMIT ?)""")
+        params += [query, RANK_WINDOW]
+    parts.append(f"""SELECT * FROM (
+                         SELECT 'appointment', a.id, a.name, a.phone, a.date, a.time, a.service, a.status,
+                                bm25(appointments_fts, {', '.join(map(str, APPOINTMENT_WEIGHTS))}) AS rank
+                         FROM appointments_fts JOIN appointments a ON a.id = appointments_fts.rowid
+                         WHERE appointments_fts MATCH ? AND a.tenant_id = ?
+                         ORDER BY appointments_fts.rowid DESC LIMIT ?)""")
+    params += [query, tenant_id, RANK_WINDOW]
+    rows = conn.execute(' UNION ALL '.join(parts) + " ORDER BY rank, 2 DESC LIMIT ? OFFSET ?",
+                        params + [size + 1, offset]).fetchall()
+    return [row[:8] for row in rows[:size]], len(rows) > size
@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+# Сводка по дням и салонам для панели мастера. Обновляется в тех же
+# транзакциях, что и записи/отмены, поэтому панель читает одну-две строки
+# на день вместо агрегации по appointments.
+
+
+def record_booking(conn, tenant_id, day_iso, service_key, price):
+    conn.execute("""INSERT INTO daily_stats (tenant_id, day, bookings, revenue) VALUES (?, ?, 1, ?)
+                    ON CONFLICT(tenant_id, day) DO UPDATE SET
+                        bookings = bookings + 1, revenue = revenue + excluded.revenue""",
+                 (tenant_id, day_iso, price or 0))
+    conn.execute("""INSERT INTO daily_service_stats (tenant_id, day, service_key, bookings, revenue)
+                    VALUES (?, ?, ?, 1, ?)
+                    ON CONFLICT(tenant_id, day, service_key) DO UPDATE SET
+                        bookings = bookings + 1, revenue = revenue + excluded.revenue""",
+                 (tenant_id, day_iso, service_key, price or 0))
+
+
+def record_cancellation(conn, tenant_id, day_iso, service_key, price):
+    conn.execute("""INSERT INTO daily_stats (tenant_id, day, bookings, cancellations, revenue)
+                    VALUES (?, ?, 0, 1, 0)
+                    ON CONFLICT(tenant_id, day) DO UPDATE SET
+                        bookings = bookings - 1, cancellations = cancellations + 1,
+                        revenue = revenue - ?""",
+                 (tenant_id, day_iso, price or 0))
+    conn.execute("""UPDATE daily_service_stats SET bookings = bookings - 1, revenue = revenue - ?
+                    WHERE tenant_id = ? AND day = ? AND service_key = ?""",
+                 (price or 0, tenant_id, day_iso, service_key))
+
+
+# Те же агрегаты, посчитанные по сырым таблицам; {source} — appointments
+# или appointments вместе с архивом прошедших записей
+RAW_DAILY_SQL = """SELECT tenant_id, day,
+                          SUM(status = 'active'),
+                          SUM(status = 'cancelled'),
+                          SUM(CASE WHEN status = 'active' THEN price ELSE 0 END)
+                   FROM {source} WHERE day IS NOT NULL GROUP BY tenant_id, day"""
+RAW_SERVICE_SQL = """SELECT tenant_id, day, service_key, COUNT(*), SUM(price)
+                     FROM {source} WHERE day IS NOT NULL AND status = 'active'
+                     GROUP BY tenant_id, day, service_key"""
+
+SOURCE = """(SELECT tenant_id, day, status, price, service_key FROM appointments
+             UNION ALL
+             SELECT tenant_id, day, status, price, service_key FROM appointments_archive)"""
+
+
+def rebuild(conn):
+    # Сверка сводки с appointments и архивом; возвращает число расходившихся
+    # дней (по всем салонам)
+    raw_daily = RAW_DAILY_SQL.format(source=SOURCE)
+    stored = "SELECT tenant_id, day, bookings, cancellations, revenue FROM daily_stats"
+    mismatched = conn.execute(f"""SELECT COUNT(*) FROM (
+                                      SELECT tenant_id, day FROM (SELECT * FROM ({raw_daily}) EXCEPT {stored})
+                                      UNION
+                                      SELECT tenant_id, day FROM ({stored} EXCEPT SELECT * FROM ({raw_daily})))"""
+                              ).fetchone()[0]
+    conn.execute("DELETE FROM daily_stats")
+    conn.execute(f"INSERT INTO daily_stats (tenant_id, day, bookings, cancellations, revenue) {raw_daily}")
+    conn.execute("DELETE FROM daily_service_stats")
+    conn.execute(f"INSERT INTO daily_service_stats (tenant_id, day, service_key, bookings, revenue) "
+                 f"{RAW_SERVICE_SQL.format(source=SOURCE)}")
+    return mismatched
+
+
+def _summary(conn, tenant_id, first, last):
+    bookings, cancellations, revenue = conn.execute(
+        """SELECT COALESCE(SUM(bookings), 0), COALESCE(SUM(cancellations), 0), COALESCE(SUM(revenue), 0)
+           FROM daily_stats WHERE tenant_id = ? AND day BETWEEN ? AND ?""", (tenant_id, first, last)).fetchone()
+    services = conn.execute("""SELECT service_key, SUM(bookings), SUM(revenue) FROM daily_service_stats
+                               WHERE tenant_id = ? AND day BETWEEN ? AND ? GROUP BY service_key
+                               HAVING SUM(bookings) > 0 ORDER BY SUM(bookings) DESC""",
+                            (tenant_id, first, last)).fetchall()
+    return {'bookings': bookings, 'cancellations': cancellations, 'revenue': revenue, 'services': services}
+
+
+def dashboard(conn, tenant_id, today=None):
+    # Сегодня, текущая неделя и месяц — не больше 31 строки на период
+    today = today or date.today()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    return {
+        'today': _summary(conn, tenant_id, today.isoformat(), today.isoformat()),
+        'week': _summary(conn, tenant_id, week_start.isoformat(), (week_start + timedelta(days=6)).isoformat()),
+        'month': _summary(conn, tenant_id, month_start.isoformat(), (next_month - timedelta(days=1)).isoformat()),
+    }
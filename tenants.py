@@ -0,0 +1,133 @@
+import os
+import asyncio
+import logging
+
+from scheduling import WorkingHours, to_minutes, parse_breaks
+from render import Renderer
+from availability import availability
+
+logger = logging.getLogger(__name__)
+
+# Салон по умолчанию: исходный единственный салон (миграция 13)
+DEFAULT_TENANT = 1
+# Как часто процессы бота проверяют tenants.version
+TENANT_RELOAD_SECONDS = int(os.environ.get('TENANT_RELOAD_SECONDS', '60'))
+# chat_id владельца развертывания: выгрузка базы и поиск по всем клиентам.
+# Задается только оператором; пока его нет, команды владельца недоступны.
+# Он же мастер основного салона, если tenants.master_chat_id не заполнен.
+OWNER_CHAT_ID = int(os.environ.get('OWNER_CHAT_ID', '0')) or None
+
+
+def is_owner(user_id):
+    return OWNER_CHAT_ID is not None and user_id == OWNER_CHAT_ID
+
+
+class TenantConfig:
+    # Снимок настроек одного салона. При перезагрузке заменяется целиком,
+    # поэтому обработчик видит согласованные услуги, часы и клавиатуры.
+
+    def __init__(self, row, services):
+        (self.id, self.slug, self.name, self.address, self.master_phone, self.master_chat_id,
+         times, day_start, day_end, breaks, self.day_capacity, self.version) = row
+        self.times = [time.strip() for time in times.split(',') if time.strip()]
+        self.hours = WorkingHours(to_minutes(day_start), to_minutes(day_end), parse_breaks(breaks))
+        # key -> {'name', 'price', 'duration'} в порядке показа
+        self.services = services
+        self.renderer = None
+
+
+def load_tenants(conn):
+    services = {}
+    for tenant_id, key, name, price, duration in conn.execute(
+            """SELECT tenant_id, key, name, price, duration FROM tenant_services
+               WHERE active = 1 ORDER BY tenant_id, position, key"""):
+        services.setdefault(tenant_id, {})[key] = {'name': name, 'price': price, 'duration': duration}
+    rows = conn.execute("""SELECT id, slug, name, address, master_phone, master_chat_id, times,
+                                  day_start, day_end, breaks, day_capacity, version
+                           FROM tenants WHERE active = 1 ORDER BY id""").fetchall()
+    return [(row, services.get(row[0], {})) for row in rows]
+
+
+def tenant_versions(conn):
+    return tuple(conn.execute("SELECT id, version FROM tenants WHERE active = 1 ORDER BY id").fetchall())
+
+
+class TenantRegistry:
+    # Кэш настроек салонов в памяти процесса. Перечитывается целиком, когда
+    # меняется хотя бы одна tenants.version (триггеры увеличивают ее при
+    # любой правке салона или его услуг).
+
+    def __init__(self, availability):
+        self.availability = availability
+        self.db = None
+        self._configs = {}
+        self._by_slug = {}
+        self._by_master = {}
+        self._versions = ()
+        self.loaded = False
+        self._loading = None
+
+    async def ensure(self, db):
+        # Настройки нужны обработчику раньше, чем их загрузил фоновый
+        # прогрев: загружаем сейчас, одновременные обновления ждут одну загрузку
+        if self.loaded:
+            return
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.ensure_future(self.load(db))
+        await asyncio.shield(self._loading)
+
+    async def load(self, db):
+        self.db = db
+        loaded = await db.run(load_tenants, label='tenants_load')
+        configs = {}
+        for row, services in loaded:
+            config = TenantConfig(row, services)
+            if config.id == DEFAULT_TENANT and not config.master_chat_id:
+                config.master_chat_id = OWNER_CHAT_ID
+            if not config.master_chat_id:
+                logger.warning(f"Салон {config.id} ({config.slug}): мастер не задан (tenants.master_chat_id"
+                               f"{' или OWNER_CHAT_ID' if config.id == DEFAULT_TENANT else ''}), "
+                               f"уведомления о записях не отправляются")
+            self.availability.configure(config.id, config.times, config.hours, config.day_capacity)
+            config.renderer = Renderer(config.services, self.availability.get(config.id), config.name)
+            configs[config.id] = config
+        self._configs = configs
+        self._by_slug = {config.slug: config for config in configs.values()}
+        self._by_master = {config.master_chat_id: config for config in configs.values() if config.master_chat_id}
+        self._versions = tuple((config.id, config.version) for config in configs.values())
+        self.loaded = True
+        logger.info(f"Настройки салонов загружены: {len(configs)}")
+
+    def start(self, application):
+        application.job_queue.run_repeating(self._reload_job, interval=TENANT_RELOAD_SECONDS,
+                                            first=TENANT_RELOAD_SECONDS, name='tenants_reload')
+
+    async def _reload_job(self, context):
+        await self.reload_if_changed()
+
+    async def reload_if_changed(self):
+        versions = await self.db.run(tenant_versions, label='tenants_versions')
+        if versions == self._versions:
+            return False
+        await self.load(self.db)
+        return True
+
+    def get(self, tenant_id):
+        # Неизвестный или отключенный салон — салон по умолчанию
+        return self._configs.get(tenant_id) or self._configs.get(DEFAULT_TENANT)
+
+    def by_slug(self, slug):
+        return self._by_slug.get(slug)
+
+    def for_master(self, user_id):
+        return self._by_master.get(user_id)
+
+    def all(self):
+        return list(self._configs.values())
+
+    def master_chat_id(self, tenant_id):
+        config = self.get(tenant_id or DEFAULT_TENANT)
+        return config.master_chat_id if config else None
+
+
+tenant_registry = TenantRegistry(availability)
@@ -0,0 +1,152 @@
+import json
+import signal
+import asyncio
+import logging
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from tornado.httpserver import HTTPServer
+from tornado.web import Application as WebApplication, RequestHandler
+
+from metrics import MetricsHandler
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    # Обновления обрабатываются параллельно, но внутри одного чата — строго
+    # по очереди, чтобы состояния ConversationHandler не перепутались.
+    # guard (FloodGuard) отбрасывает спам и дубли до постановки в очередь.
+
+    def __init__(self, max_concurrent_updates, guard=None):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+        self.guard = guard
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_update(self, update, coroutine):
+        reason = self.guard.check(update) if self.guard is not None else None
+        if reason is not None:
+            coroutine.close()
+            await self.guard.reject(update, reason)
+            return
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            await super().process_update(update, coroutine)
+            return
+        # Блокировка чата берется до общего семафора: очередь одного
+        # активного чата не занимает слоты остальных
+        entry = self._locks.get(chat.id)
+        if entry is None:
+            entry = self._locks[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[chat.id]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+
+class WebhookHandler(RequestHandler):
+    def initialize(self, bot_app, secret_token):
+        self.bot_app = bot_app
+        self.secret_token = secret_token
+
+    async def post(self):
+        if self.secret_token and self.request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret_token:
+            self.set_status(403)
+            return
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            self.set_status(400)
+            return
+        update = Update.de_json(data, self.bot_app.bot)
+        await self.bot_app.update_queue.put(update)
+        self.set_status(200)
+
+
+class HealthHandler(RequestHandler):
+    # Процесс жив и принимает соединения
+    def get(self):
+        self.write('ok')
+
+
+def start_metrics_server(listen, port):
+    # В режиме polling вебхука нет — метрики и /healthz на отдельном порту
+    server = HTTPServer(WebApplication([(r"/metrics", MetricsHandler), (r"/healthz", HealthHandler)]))
+    server.listen(port, listen)
+    logger.info(f"Метрики доступны на {listen}:{port}/metrics")
+    return server
+
+
+class ReadyHandler(RequestHandler):
+    # Бот запущен и принимает обновления (кэши догреваются в фоне)
+    def initialize(self, ready):
+        self.ready = ready
+
+    def get(self):
+        if self.ready():
+            self.write('ready')
+        else:
+            self.set_status(503)
+            self.write('starting')
+
+
+def make_web_app(application, url_path, secret_token, ready):
+    return WebApplication([
+        (rf"/{url_path.strip('/')}", WebhookHandler, {'bot_app': application, 'secret_token': secret_token}),
+        (r"/healthz", HealthHandler),
+        (r"/readyz", ReadyHandler, {'ready': ready}),
+        (r"/metrics", MetricsHandler),
+    ])
+
+
+async def serve(application, listen, port, url_path, webhook_url=None, secret_token=None,
+                ready=lambda: True, stop_event=None):
+    # Жизненный цикл как у Application.run_webhook, но со своим HTTP-сервером,
+    # где кроме вебхука есть /healthz и /readyz
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    server = HTTPServer(make_web_app(application, url_path, secret_token,
+                                     lambda: application.running and ready()))
+    server.listen(port, listen)
+    logger.info(f"HTTP-сервер слушает {listen}:{port}")
+    try:
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=f"{webhook_url.rstrip('/')}/{url_path.strip('/')}",
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info("Вебхук установлен")
+        await stop_event.wait()
+    finally:
+        server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
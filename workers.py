@@ -0,0 +1,220 @@
+import os
+import json
+import signal
+import asyncio
+import logging
+import multiprocessing
+
+from telegram import Bot, Update
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.web import Application as WebApplication, RequestHandler
+
+from webhook import HealthHandler
+from availability import availability
+from reviews import ratings
+from reminders import reminders
+
+logger = logging.getLogger(__name__)
+
+# Несколько процессов бота за одним вебхуком. Фронтовой процесс только
+# принимает обновления и пересылает каждое воркеру chat_id % WORKERS:
+# все обновления одного чата попадают в один процесс, поэтому состояние
+# диалога, user_data и порядок внутри чата остаются локальными.
+WORKERS = int(os.environ.get('WORKERS', '1'))
+WORKER_BASE_PORT = int(os.environ.get('WORKER_BASE_PORT', '8100'))
+# Как часто воркеры сверяют кэши с общей базой (записи других процессов)
+WORKER_SYNC_SECONDS = int(os.environ.get('WORKER_SYNC_SECONDS', '30'))
+# Пауза перед перезапуском упавшего воркера
+WORKER_RESTART_DELAY = 1
+
+# Номер текущего процесса-воркера; None — единственный процесс
+_worker_index = None
+
+
+def set_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def is_primary():
+    # Фоновые задачи (outbox, напоминания, обслуживание базы) — только здесь
+    return _worker_index in (None, 0)
+
+
+def worker_port(index):
+    return WORKER_BASE_PORT + index
+
+
+def route_key(data):
+    # chat_id обновления, как effective_chat в PTB; без чата — отправитель
+    for key, payload in data.items():
+        if not isinstance(payload, dict):
+            continue
+        chat = payload.get('chat') or (payload.get('message') or {}).get('chat')
+        if chat and 'id' in chat:
+            return chat['id']
+        sender = payload.get('from') or payload.get('user')
+        if sender and 'id' in sender:
+            return sender['id']
+    return data.get('update_id', 0)
+
+
+class WorkerSync:
+    # У каждого воркера свои индексы занятости и агрегат оценок, а пишут
+    # в базу все. Периодически сверяем их: в индексе занятости — только
+    # изменившиеся дни; первый воркер заодно догружает напоминания о
+    # записях, сделанных в других процессах.
+
+    def __init__(self):
+        self.db = None
+
+    def start(self, application, db):
+        if WORKERS <= 1 or _worker_index is None:
+            return
+        self.db = db
+        application.job_queue.run_repeating(self._job, interval=WORKER_SYNC_SECONDS,
+                                            first=WORKER_SYNC_SECONDS, name='worker_sync')
+
+    async def _job(self, context):
+        await self.run()
+
+    async def run(self):
+        await availability.sync(self.db)
+        ratings.invalidate()
+        if is_primary():
+            await reminders.load_window()
+
+
+sync = WorkerSync()
+
+
+async def fetch_worker(index, path, **kwargs):
+    # Воркер перезапускается или еще не слушает порт — ответим 502
+    try:
+        return await AsyncHTTPClient().fetch(f"http://127.0.0.1:{worker_port(index)}/{path}",
+                                             raise_error=False, **kwargs)
+    except OSError:
+        return None
+
+
+def status_of(response):
+    return response.code if response is not None and response.code < 599 else 502
+
+
+class RouterHandler(RequestHandler):
+    def initialize(self, url_path, secret_token):
+        self.url_path = url_path
+        self.secret_token = secret_token
+
+    async def post(self):
+        if self.secret_token and self.request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret_token:
+            self.set_status(403)
+            return
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            self.set_status(400)
+            return
+        index = route_key(data) % WORKERS
+        headers = {'Content-Type': 'application/json'}
+        if self.secret_token:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.secret_token
+        # Ошибка воркера возвращается Telegram, и он повторит доставку
+        response = await fetch_worker(index, self.url_path, method='POST', body=self.request.body, headers=headers)
+        self.set_status(status_of(response))
+
+
+class RouterReadyHandler(RequestHandler):
+    # Готов, когда готовы все воркеры
+    async def get(self):
+        for index in range(WORKERS):
+            response = await fetch_worker(index, 'readyz')
+            if status_of(response) != 200:
+                self.set_status(503)
+                self.write(f'worker {index} starting')
+                return
+        self.write('ready')
+
+
+class WorkerMetricsHandler(RequestHandler):
+    # Метрики каждого воркера: /metrics/<номер>
+    async def get(self, index):
+        index = int(index)
+        if index >= WORKERS:
+            self.set_status(404)
+            return
+        response = await fetch_worker(index, 'metrics')
+        self.set_status(status_of(response))
+        if status_of(response) == 200:
+            self.set_header('Content-Type', response.headers.get('Content-Type', 'text/plain'))
+            self.write(response.body)
+
+
+def make_router_app(url_path, secret_token):
+    url_path = url_path.strip('/')
+    return WebApplication([
+        (rf"/{url_path}", RouterHandler, {'url_path': url_path, 'secret_token': secret_token}),
+        (r"/healthz", HealthHandler),
+        (r"/readyz", RouterReadyHandler),
+        (r"/metrics/(\d+)", WorkerMetricsHandler),
+    ])
+
+
+def run_router(token, target, listen, port, url_path, webhook_url=None, secret_token=None):
+    # target(index) запускает воркер; процессы создаются через spawn, чтобы
+    # не наследовать пул соединений SQLite и event loop родителя
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+
+    def spawn(index):
+        process = context.Process(target=target, args=(index,), name=f'bot-worker-{index}')
+        process.start()
+        processes[index] = process
+        logger.info(f"Воркер {index} (pid {process.pid}) слушает 127.0.0.1:{worker_port(index)}")
+
+    async def supervise(stop_event):
+        # Упавший воркер перезапускаем; его чаты ждут, Telegram повторит доставку
+        while not stop_event.is_set():
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    logger.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапуск")
+                    spawn(index)
+            try:
+                await asyncio.wait_for(stop_event.wait(), WORKER_RESTART_DELAY)
+            except asyncio.TimeoutError:
+                pass
+
+    async def main():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        for index in range(WORKERS):
+            spawn(index)
+        server = HTTPServer(make_router_app(url_path, secret_token))
+        server.listen(port, listen)
+        logger.info(f"Маршрутизатор слушает {listen}:{port}, воркеров: {WORKERS}")
+        try:
+            if webhook_url:
+                async with Bot(token) as bot:
+                    await bot.set_webhook(
+                        url=f"{webhook_url.rstrip('/')}/{url_path.strip('/')}",
+                        secret_token=secret_token,
+                        allowed_updates=Update.ALL_TYPES,
+                    )
+                logger.info("Вебхук установлен")
+            await supervise(stop_event)
+        finally:
+            server.stop()
+            for process in processes.values():
+                if process.is_alive():
+                    process.terminate()
+            for process in processes.values():
+                process.join()
+
+    asyncio.run(main())